@@ -0,0 +1,108 @@
+from cooking_zoo.cooking_book.recipe_drawer import RECIPES
+from cooking_zoo.cooking_world.component_store import ComponentStore
+from cooking_zoo.cooking_world.world_objects import StringToClass
+from collections import defaultdict
+import itertools
+
+
+def condition_attributes(recipes):
+    """:return: {class name: attributes the nodes of that class in `recipes` have conditions on}"""
+    attributes = defaultdict(set)
+    for factory in recipes.values():
+        for node in factory().node_list:
+            attributes[node.name].update(name for name, _ in node.conditions)
+    return {name: tuple(sorted(names)) for name, names in attributes.items()}
+
+
+def contested_classes(recipes):
+    """:return: class names more than one node of a recipe matches, which node gets which object depends on order"""
+    contested = set()
+    for factory in recipes.values():
+        names = [node.name for node in factory().node_list]
+        contested.update(name for name in names if names.count(name) > 1)
+    return contested
+
+
+CONDITION_ATTRIBUTES = condition_attributes(RECIPES)
+CONTESTED_CLASSES = contested_classes(RECIPES)
+
+
+def object_key(obj):
+    """:return: the class of `obj` and the states of it recipe conditions check, encoded like ComponentStore columns"""
+    name = type(obj).__name__
+    return name, tuple(ComponentStore.encode(getattr(obj, attribute, None))
+                       for attribute in CONDITION_ATTRIBUTES.get(name, ()))
+
+
+def split_deliveries(objects):
+    """:return: lists of the `objects` that share a location, e.g. what each AbsorbingDeliversquare consumed"""
+    groups = defaultdict(list)
+    for obj in objects:
+        groups[obj.location].append(obj)
+    return list(groups.values())
+
+
+def delivery_key(objects):
+    """
+    :return: key that is the same for every order of `objects`: the sorted object keys of each group of objects that
+    share a location, which is how recipes tell what contains what, sorted
+    """
+    return tuple(sorted(tuple(sorted(map(object_key, group))) for group in split_deliveries(objects)))
+
+
+def match_recipes(objects, recipes, checkers):
+    """
+    :param recipes: {name: recipe factory}
+    :param checkers: {name: Recipe} built once from `recipes` to check `objects` against, their marks get overwritten
+    :return: {name: Recipe} of the `recipes` that `objects` complete, checked one by one
+    """
+    completed = {}
+    for name, checker in checkers.items():
+        checker.update_recipe_state(objects)
+        if checker.completed():
+            recipe = completed[name] = recipes[name]()
+            recipe.update_recipe_state(objects)
+    return completed
+
+
+def build_index(recipes):
+    """
+    :return: {delivery key: {name: Recipe} of the recipes it completes} of every delivery on one location made of
+    objects that each fulfill a different node of one of `recipes`. Recipes check each of these nodes against the only
+    object of its class, so the order of the objects doesn't matter. Nodes of contested classes are left out.
+    """
+    checkers = {name: factory() for name, factory in recipes.items()}
+    index = {}
+    for checker in checkers.values():
+        nodes = [node for node in checker.node_list if node.name not in CONTESTED_CLASSES]
+        for size in range(1, len(nodes) + 1):
+            for subset in itertools.combinations(nodes, size):
+                objects = []
+                for node in subset:
+                    obj = StringToClass[node.name]((0, 0), unique_id=-1)
+                    for attribute, value in node.conditions:
+                        setattr(obj, attribute, value)
+                    objects.append(obj)
+                key = delivery_key(objects)
+                if key not in index:
+                    index[key] = match_recipes(objects, recipes, checkers)
+    return index
+
+
+# delivery key -> {name: Recipe} of the RECIPES the delivered objects complete, built once when the module is imported
+DELIVERY_INDEX = build_index(RECIPES)
+# one Recipe of each of the RECIPES to check the deliveries that aren't in DELIVERY_INDEX against
+RECIPE_CHECKERS = {name: factory() for name, factory in RECIPES.items()}
+
+
+def classify_delivery(objects):
+    """
+    :param objects: what one AbsorbingDeliversquare consumed, see split_deliveries
+    :return: {name: completed Recipe} of the RECIPES that `objects` complete. Deliveries in DELIVERY_INDEX are
+    classified with one lookup and get the Recipes of the index, which are shared by every such delivery and list
+    stand-ins of the same classes and states as their world_objects. Any other delivery is checked recipe by recipe.
+    """
+    completed = DELIVERY_INDEX.get(delivery_key(objects))
+    if completed is None:
+        completed = match_recipes(objects, RECIPES, RECIPE_CHECKERS)
+    return completed
@@ -1,7 +1,7 @@
 from cooking_zoo.cooking_world.abstract_classes import Object
 from cooking_zoo.cooking_world.cooking_world import CookingWorld
 from enum import Enum
-from copy import copy, deepcopy  # TODO try non-deep copy
+from copy import copy
 from typing import List
 
 import numpy as np
@@ -34,6 +34,7 @@ class Recipe:
     def __init__(self, root_node: RecipeNode, num_goals: int):
         self.root_node = root_node
         self.node_list = [root_node] + self.expand_child_nodes(root_node)
+        self.node_names = {node.name for node in self.node_list}
         self.goal_encoding = self.goals_completed(num_goals)
 
     def goals_completed(self, num_goals):
@@ -77,27 +78,46 @@ class Recipe:
     def completed(self):
         return self.root_node.marked
 
-    def update_recipe_state(self, world):
-        world = deepcopy(world)
+    def update_recipe_state(self, world, changes=None):
+        """
+        :param changes: ChangeLog of everything that changed in `world` since the last update of this recipe. Only the
+        nodes of the object types it touches, the nodes containing those and the nodes of the same types that come
+        after them are checked again, the other nodes keep their marks. None checks every node.
+        """
+        if changes is None:
+            rechecked_names = set(self.node_names)
+        else:
+            rechecked_names = {type(obj).__name__ for obj in changes.changed_objects()} & self.node_names
+            if not rechecked_names:
+                return
+        # objects are matched in the live world, only the list passed for to_delete is copied
+        is_list = isinstance(world, List)
+        unclaimed = list(world) if is_list else copy(world.world_objects)
+        claimed = set()
+        rechecked = set()
 
         for node in reversed(self.node_list):
+            if node.name not in rechecked_names and not any(contains in rechecked for contains in node.contains):
+                claimed.update(node.world_objects)
+                continue
+            rechecked.add(node)
+            # a new match can change which objects are left for the nodes of the same type after this one
+            rechecked_names.add(node.name)
             node.marked = False
             node.world_objects = []
             if not all((contains.marked for contains in node.contains)):
                 continue
-            for obj in world.world_objects[node.name] if not isinstance(world, List) else [x for x in world if
-                                                                                           x.name() == node.name]:
+            for obj in unclaimed[node.name] if not is_list else [x for x in unclaimed if x.name() == node.name]:
                 # check for all conditions
-                if obj and self.check_conditions(node, obj):
+                if obj and obj not in claimed and self.check_conditions(node, obj):
                     node.world_objects.append(obj)
                     node.marked = True
 
-                    # once the object is used to fulfill a node, remove it from our working copy of world objects
-                    # and break the loop
-                    if not isinstance(world, List):
-                        world.world_objects[node.name].remove(obj)
+                    # once the object is used to fulfill a node, claim it and break the loop
+                    if not is_list:
+                        claimed.add(obj)
                     else:
-                        world.remove(obj)
+                        unclaimed.remove(obj)
                     break
 
     def expand_child_nodes(self, node: RecipeNode):
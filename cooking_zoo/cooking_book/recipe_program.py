@@ -0,0 +1,114 @@
+from cooking_zoo.cooking_world.component_store import ComponentStore
+from cooking_zoo.cooking_world.world_objects import StringToClass
+
+import numpy as np
+
+
+class RecipeProgram:
+    """
+    Recipe tree compiled to flat arrays, one entry per node in the order of Recipe.node_list: the class of the object
+    the node matches, the state codes it requires (as stored in ComponentStore columns) and the indices of the nodes
+    it contains, -1 padded.
+
+    evaluate() matches the nodes against ComponentStores of any number of worlds at once and gives the same marks
+    as Recipe.update_recipe_state: nodes are checked from the last to the first, each one claims the first object,
+    in world_objects order, of its class that has the required states, isn't claimed yet and shares the location of
+    the objects claimed by the nodes it contains.
+    """
+
+    def __init__(self, recipe):
+        nodes = recipe.node_list
+        index = {id(node): idx for idx, node in enumerate(nodes)}
+        if len(index) != len(nodes):
+            raise ValueError("Recipes that contain a node more than once can't be compiled")
+        self.node_classes = [StringToClass[node.name] for node in nodes]
+        self.id_num = np.array([node.id_num for node in nodes], dtype=np.int64)
+        columns = {name for node in nodes for name, _ in node.conditions}
+        for name in columns:
+            if name not in ComponentStore.STATE_COLUMNS:
+                raise ValueError(f"Condition on {name} can't be compiled, it has no ComponentStore column")
+        self.columns = sorted(columns, key=ComponentStore.STATE_COLUMNS.index)
+        self.required = np.full((len(nodes), len(self.columns)), -1, dtype=np.int32)
+        self.constrained = np.zeros((len(nodes), len(self.columns)), dtype=bool)
+        for idx, node in enumerate(nodes):
+            for name, value in node.conditions:
+                self.required[idx, self.columns.index(name)] = ComponentStore.encode(value)
+                self.constrained[idx, self.columns.index(name)] = True
+        width = max((len(node.contains) for node in nodes), default=0)
+        self.children = np.full((len(nodes), width), -1, dtype=np.int64)
+        for idx, node in enumerate(nodes):
+            self.children[idx, :len(node.contains)] = [index[id(contains)] for contains in node.contains]
+
+    def __len__(self):
+        return len(self.node_classes)
+
+    def evaluate(self, worlds):
+        """
+        :param worlds: CookingWorld, list of CookingWorlds, e.g. BatchedCookingWorld.worlds, or their StoreArrays
+        :return: (marked, matched), (worlds, nodes) arrays of whether each node is fulfilled and the ComponentStore row
+        of the object it claimed, its index in world.get_object_list() + world.agents, -1 if none
+        """
+        arrays = worlds if isinstance(worlds, StoreArrays) else StoreArrays(worlds, self.columns)
+        world_idx, offsets, location = arrays.world_idx, arrays.offsets, arrays.location
+        # type id of the class of each node, -2 if no store had an object of that class yet
+        node_types = np.array([ComponentStore.TYPE_IDS.get(cls, -2) for cls in self.node_classes], dtype=np.int64)
+        candidates = arrays.type_id[:, None] == node_types
+        if self.columns:
+            states = np.stack([arrays.columns[name] for name in self.columns], axis=1)
+            candidates &= ((states[:, None, :] == self.required) | ~self.constrained).all(axis=2)
+
+        marked = np.zeros((len(arrays.stores), len(self)), dtype=bool)
+        matched = np.full((len(arrays.stores), len(self)), -1, dtype=np.int64)
+        if not len(world_idx):
+            return marked, matched
+        claimed = np.zeros(len(world_idx), dtype=bool)
+        for node in reversed(range(len(self))):
+            children = self.children[node][self.children[node] >= 0]
+            ready = marked[:, children].all(axis=1)
+            mask = candidates[:, node] & ~claimed & ready[world_idx]
+            for child in children:
+                child_location = location[offsets + matched[:, child]]
+                mask &= (location == child_location[world_idx]).all(axis=1)
+            # rows are sorted by world and then by world_objects order, so the first row of each world is the claim
+            rows = np.flatnonzero(mask)
+            if not rows.size:
+                continue
+            worlds_matched, first = np.unique(world_idx[rows], return_index=True)
+            rows = rows[first]
+            claimed[rows] = True
+            marked[worlds_matched, node] = True
+            matched[worlds_matched, node] = rows - offsets[worlds_matched]
+        return marked, matched
+
+    def goals_completed(self, marked, num_goals):
+        """:return: (worlds, num_goals) array like Recipe.goals_completed for each row of `marked`"""
+        goals = np.zeros((len(marked), num_goals), dtype=np.int32)
+        goals[:, self.id_num] = ~marked
+        return goals
+
+
+class StoreArrays:
+    """ComponentStores of several worlds, concatenated, to evaluate many programs on"""
+
+    def __init__(self, worlds, columns=ComponentStore.STATE_COLUMNS):
+        worlds = [worlds] if not isinstance(worlds, (list, tuple)) else worlds
+        self.stores = [ComponentStore(world, columns) for world in worlds]
+        sizes = [store.size for store in self.stores]
+        self.world_idx = np.repeat(np.arange(len(self.stores)), sizes)
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+        self.location = np.concatenate([store.location for store in self.stores])
+        self.unique_id = np.concatenate([store.unique_id for store in self.stores])
+        self.type_id = np.concatenate([store.type_id for store in self.stores])
+        self.columns = {name: np.concatenate([store[name] for store in self.stores]) for name in columns}
+
+
+def compile_recipes(recipes):
+    """:return: {name: RecipeProgram} of a {name: recipe factory} dict like recipe_drawer.RECIPES"""
+    return {name: RecipeProgram(factory()) for name, factory in recipes.items()}
+
+
+def evaluate_recipes(programs, worlds):
+    """:return: [(marked, matched)] of every program, see RecipeProgram.evaluate, reading the worlds only once"""
+    columns = {name for program in programs for name in program.columns}
+    arrays = StoreArrays(worlds, [name for name in ComponentStore.STATE_COLUMNS if name in columns])
+    return [program.evaluate(arrays) for program in programs]
@@ -5,14 +5,70 @@ import inspect
 import sys
 
 
+class StateAttribute:
+    """
+    Attribute that reports changes of its value to the world the object is registered with, so the world can keep
+    its change log and derived data (walkability, active objects) up to date. The value is stored in `_<name>`, which
+    has to be one of the slots of the object. While the world keeps an undo log, the object is saved to it before its
+    first change, see CookingWorld.reset_level.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.private_name = "_" + name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return getattr(obj, self.private_name)
+
+    def __set__(self, obj, value):
+        old_value = getattr(obj, self.private_name, value)
+        world = getattr(obj, "world", None)
+        if world is None or old_value == value:
+            setattr(obj, self.private_name, value)
+            return
+        if world.undo_log is not None:
+            world.log_object(obj)
+        setattr(obj, self.private_name, value)
+        world.state_changed(obj, self.name, old_value, value)
+
+
+# slot names per class, see get_slot_names
+_slot_names = {}
+
+
+def get_slot_names(obj_cls):
+    """Names of all slots of `obj_cls` and its bases, computed once per class"""
+    names = _slot_names.get(obj_cls)
+    if names is None:
+        names = []
+        for klass in reversed(obj_cls.__mro__):
+            slots = klass.__dict__.get("__slots__", ())
+            names.extend([slots] if isinstance(slots, str) else slots)
+        names = tuple(name for name in dict.fromkeys(names) if name not in ("__dict__", "__weakref__"))
+        _slot_names[obj_cls] = names
+    return names
+
+
 class Object(ABC):
+    """
+    Objects keep their attributes in __slots__ to stay small and fast to copy. A class can only have one base with
+    slots, so the mixins below only list their attributes in SLOTS and every concrete class adds the SLOTS of all
+    its mixins to its own __slots__.
+    """
+
+    __slots__ = ("unique_id", "_location", "movable", "world", "_walkable")
+
+    walkable = StateAttribute()  # you can walk on it
 
     def __init__(self, unique_id, location, movable, walkable):
         super(Object, self).__init__()
         self.unique_id = unique_id
         self._location = location
         self.movable = movable  # you can pick this one up
-        self.walkable = walkable  # you can walk on it
+        self.world = None  # the CookingWorld this object is registered with, if any
+        self.walkable = walkable
 
     def name(self) -> str:
         return type(self).__name__
@@ -20,6 +76,12 @@ class Object(ABC):
     def move_to(self, new_location):
         self.location = new_location
 
+    def new_object_id(self):
+        """
+        :return: id for an object created by this one, from its world, or None outside of a world
+        """
+        return self.world.new_object_id() if self.world is not None else None
+
     @property
     def location(self):
         return self._location
@@ -27,7 +89,23 @@ class Object(ABC):
     @location.setter
     def location(self, new_location):
         assert new_location is not None
+        old_location = self._location
+        if self.world is not None and self.world.undo_log is not None and old_location != new_location:
+            self.world.log_object(self)
         self._location = new_location
+        if self.world is not None:
+            self.world.update_object_location(self, old_location, new_location)
+
+    def __getstate__(self):
+        # copies and pickles are detached from the world, it reattaches its own objects
+        state = {}
+        for name in get_slot_names(type(self)):
+            try:
+                state[name] = getattr(self, name)
+            except AttributeError:
+                pass  # slot that was never set
+        state["world"] = None
+        return getattr(self, "__dict__", None), state
 
     @property
     def physical_state(self):
@@ -94,6 +172,11 @@ class Object(ABC):
 
 class ActionObject(ABC):
 
+    __slots__ = ()
+    SLOTS = ("_status",)
+
+    status = StateAttribute()
+
     def __init__(self):
         super(ActionObject, self).__init__()
         self.status = ActionObjectState.NOT_USABLE
@@ -105,6 +188,11 @@ class ActionObject(ABC):
 
 class ToggleObject(ABC):
 
+    __slots__ = ()
+    SLOTS = ("_toggle",)
+
+    toggle = StateAttribute()
+
     def __init__(self, toggle=False):
         super(ToggleObject, self).__init__()
         self.toggle = toggle
@@ -115,6 +203,9 @@ class ToggleObject(ABC):
 
 class TemperatureObject:
 
+    __slots__ = ()
+    SLOTS = ("temperature",)
+
     def __init__(self):
         super(TemperatureObject, self).__init__()
         self.temperature = Temperature.MILD
@@ -126,6 +217,8 @@ class TemperatureObject:
 
 class ProcessingObject(ABC):
 
+    __slots__ = ()
+
     def __init__(self):
         super(ProcessingObject, self).__init__()
 
@@ -133,9 +226,18 @@ class ProcessingObject(ABC):
     def process(self):
         pass
 
+    def is_active(self) -> bool:
+        """
+        :return: False if process() can't change anything right now, the world skips inactive objects
+        """
+        return True
+
 
 class LinkedObject(ABC):
 
+    __slots__ = ()
+    SLOTS = ("linked_objects", "linked_group_id")
+
     def __init__(self):
         super(LinkedObject, self).__init__()
         self.linked_objects = []
@@ -158,9 +260,17 @@ class LinkedObject(ABC):
     def process_linked_objects(self):
         pass
 
+    def has_pending_links(self) -> bool:
+        """
+        :return: False if process_linked_objects() can't change anything right now, the world skips these objects
+        """
+        return True
+
 
 class ProgressingObject(ABC):
 
+    __slots__ = ()
+
     def __init__(self):
         super(ProgressingObject, self).__init__()
 
@@ -171,9 +281,18 @@ class ProgressingObject(ABC):
         """
         pass
 
+    def is_active(self) -> bool:
+        """
+        :return: False if progress() can't change anything right now, the world skips inactive objects
+        """
+        return True
+
 
 class ContentObject:
 
+    __slots__ = ()
+    SLOTS = ("content", "max_content")
+
     def __init__(self, max_content=1):
         super(ContentObject, self).__init__()
         self.content = []
@@ -202,6 +321,8 @@ class ContentObject:
 
 class Food:
 
+    __slots__ = ()
+
     def __init__(self):
         super(Food, self).__init__()
 
@@ -212,6 +333,8 @@ class Food:
 
 class StaticObject(Object, ABC):
 
+    __slots__ = ()
+
     def __init__(self, unique_id, location, walkable):
         super().__init__(unique_id, location, False, walkable)
 
@@ -229,6 +352,10 @@ class StaticObject(Object, ABC):
 
 class DynamicObject(Object, ABC):
 
+    __slots__ = ("_free",)
+
+    free = StateAttribute()
+
     def __init__(self, unique_id, location):
         super().__init__(unique_id, location, True, False)
         self.free = True
@@ -236,6 +363,11 @@ class DynamicObject(Object, ABC):
 
 class TemperatureFood(DynamicObject, Food, TemperatureObject, ABC):
 
+    __slots__ = ()
+    SLOTS = TemperatureObject.SLOTS + ("_current_progress", "max_progress", "min_progress", "food_state")
+
+    current_progress = StateAttribute()
+
     def __init__(self, food_state):
         super(TemperatureFood, self).__init__()
         self.current_progress = 1
@@ -246,6 +378,11 @@ class TemperatureFood(DynamicObject, Food, TemperatureObject, ABC):
 
 class ChopFood(DynamicObject, Food, ABC):
 
+    __slots__ = ()
+    SLOTS = ("_chop_state",)
+
+    chop_state = StateAttribute()
+
     def __init__(self, unique_id, location):
         super().__init__(unique_id, location)
         self.chop_state = ChopFoodStates.FRESH
@@ -259,6 +396,12 @@ class ChopFood(DynamicObject, Food, ABC):
 
 class BlenderFood(DynamicObject, Food, ABC):
 
+    __slots__ = ()
+    SLOTS = ("_current_progress", "max_progress", "min_progress", "_blend_state")
+
+    current_progress = StateAttribute()
+    blend_state = StateAttribute()
+
     def __init__(self, unique_id, location):
         super().__init__(unique_id, location)
         self.current_progress = 5
@@ -278,6 +421,12 @@ class BlenderFood(DynamicObject, Food, ABC):
 
 class ToasterFood(DynamicObject, Food, ABC):
 
+    __slots__ = ()
+    SLOTS = ("_current_progress", "max_progress", "min_progress", "_toast_state")
+
+    current_progress = StateAttribute()
+    toast_state = StateAttribute()
+
     def __init__(self, unique_id, location):
         super().__init__(unique_id, location)
         self.current_progress = 15
@@ -296,6 +445,12 @@ class ToasterFood(DynamicObject, Food, ABC):
 
 class MicrowaveFood(DynamicObject, Food, ABC):
 
+    __slots__ = ()
+    SLOTS = ("_current_progress", "max_progress", "min_progress", "_microwave_state")
+
+    current_progress = StateAttribute()
+    microwave_state = StateAttribute()
+
     def __init__(self, unique_id, location):
         super().__init__(unique_id, location)
         self.current_progress = 1
@@ -314,6 +469,12 @@ class MicrowaveFood(DynamicObject, Food, ABC):
 
 class PotFood(DynamicObject, Food, ABC):
 
+    __slots__ = ()
+    SLOTS = ("_current_progress", "max_progress", "min_progress", "_boil_state")
+
+    current_progress = StateAttribute()
+    boil_state = StateAttribute()
+
     def __init__(self, unique_id, location):
         super().__init__(unique_id, location)
         self.current_progress = 12
@@ -331,6 +492,12 @@ class PotFood(DynamicObject, Food, ABC):
 
 class PanFood(DynamicObject, Food, ABC):
 
+    __slots__ = ()
+    SLOTS = ("_current_progress", "max_progress", "min_progress", "_fry_state")
+
+    current_progress = StateAttribute()
+    fry_state = StateAttribute()
+
     def __init__(self, unique_id, location):
         super().__init__(unique_id, location)
         self.current_progress = 10
@@ -346,6 +513,7 @@ class PanFood(DynamicObject, Food, ABC):
             return True
         return False
 
+# StateAttribute is a descriptor, not a game class
 ABSTRACT_GAME_CLASSES = [m[1] for m in inspect.getmembers(sys.modules[__name__], inspect.isclass)
-                         if m[1].__module__ == __name__]
+                         if m[1].__module__ == __name__ and m[1] is not StateAttribute]
 
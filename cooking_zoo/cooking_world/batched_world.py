@@ -0,0 +1,178 @@
+from cooking_zoo.cooking_world.cooking_world import CookingWorld
+from cooking_zoo.cooking_world.change_log import ChangeLog
+from cooking_zoo.cooking_world.actions import ActionScheme1, ActionScheme3
+from cooking_zoo.cooking_world.cooking_action_util import action_scheme1, action_scheme3
+import numpy as np
+
+
+class BatchedCookingWorld:
+    """
+    Steps N kitchens of the same level with one (N, num_agents) action array per tick.
+
+    Agent locations, orientations and activity as well as walkability and agent occupancy of every kitchen are kept in
+    (N, ...) arrays. Only the movement rules are vectorized: orientation changes, bound checks, walkability and
+    collisions are resolved for the whole batch at once. Everything else still runs kitchen by kitchen in Python
+    through the object engine: walking and interacting for the agents that actually move or interact, in agent order,
+    then progress_world, the linked interactions and agent spawning. So every kitchen ends up exactly where
+    CookingWorld.world_step would have put it. Holding slots, food progress, appliance toggles and container contents
+    stay on the objects, there are no batched rules for them.
+
+    The arrays are read from the worlds again at the start of every step, and rebuilt when a world got new grids, e.g.
+    from load_level, so worlds can be reloaded or changed between steps.
+    """
+
+    def __init__(self, worlds):
+        assert worlds, "Need at least one world"
+        self.worlds = list(worlds)
+        self.action_scheme = self.worlds[0].action_scheme
+        if self.action_scheme not in (ActionScheme1, ActionScheme3):
+            raise Exception("Batched stepping supports only ActionScheme1 and ActionScheme3")
+        for world in self.worlds:
+            assert world.action_scheme == self.action_scheme, "All worlds need the same action scheme"
+        self.walk_actions = np.array(self.action_scheme.WALK_ACTIONS)
+        self.interact_actions = np.array(self.action_scheme.INTERACT_ACTIONS, dtype=np.int64)
+        self.bind()
+
+    @classmethod
+    def from_level(cls, num_worlds, level, num_agents, agents_arms=None, action_scheme_class=ActionScheme1,
+                   meta_file="", **world_kwargs):
+        agents_arms = [1] * num_agents if agents_arms is None else agents_arms
+        worlds = []
+        for _ in range(num_worlds):
+            world = CookingWorld(action_scheme_class, meta_file, **world_kwargs)
+            world.load_level(level, num_agents, agents_arms)
+            worlds.append(world)
+        return cls(worlds)
+
+    def __len__(self):
+        return len(self.worlds)
+
+    def reset(self, level, num_agents, agents_arms=None):
+        """Load `level` into every world again, see CookingWorld.load_level"""
+        agents_arms = [1] * num_agents if agents_arms is None else agents_arms
+        for world in self.worlds:
+            world.load_level(level, num_agents, agents_arms)
+        self.bind()
+
+    def bind(self):
+        """(Re)build the batched arrays from the worlds and make each world's grids views into them"""
+        self.width = self.worlds[0].width
+        self.height = self.worlds[0].height
+        self.num_agents = len(self.worlds[0].agents)
+        for world in self.worlds:
+            assert (world.width, world.height) == (self.width, self.height), "All worlds need the same level"
+            assert len(world.agents) == self.num_agents, "All worlds need the same number of agents"
+        self.walkable = np.stack([world.walkable_grid for world in self.worlds])
+        self.agent_occupancy = np.stack([world.agent_occupancy for world in self.worlds])
+        self.end_counts = np.zeros_like(self.agent_occupancy)
+        for idx, world in enumerate(self.worlds):
+            world.walkable_grid = self.walkable[idx]
+            world.agent_occupancy = self.agent_occupancy[idx]
+        self.bound_grids = [(world.walkable_grid, world.agent_occupancy) for world in self.worlds]
+        self.read_agents()
+
+    def sync(self):
+        """Rebind the worlds that got new grids since bind(), e.g. from load_level, and read their agents again"""
+        if any(world.walkable_grid is not walkable or world.agent_occupancy is not occupancy
+               for world, (walkable, occupancy) in zip(self.worlds, self.bound_grids)):
+            self.bind()
+        else:
+            self.read_agents()
+
+    def read_agents(self):
+        self.agent_locations = np.array([[agent.location for agent in world.agents] for world in self.worlds],
+                                        dtype=np.int64).reshape(len(self.worlds), self.num_agents, 2)
+        self.agent_orientations = np.array([[agent.orientation for agent in world.agents] for world in self.worlds],
+                                           dtype=np.int64).reshape(len(self.worlds), self.num_agents)
+        self.active_agents = np.array([world.active_agents for world in self.worlds],
+                                      dtype=bool).reshape(len(self.worlds), self.num_agents)
+
+    def target_locations(self, actions):
+        walk = (actions > 0) & (actions < len(CookingWorld.ACTION_OFFSETS))
+        return self.agent_locations + CookingWorld.ACTION_OFFSETS[np.where(walk, actions, 0)]
+
+    def locations_inbounds(self, locations):
+        return (locations >= 0).all(axis=-1) & (locations < (self.width, self.height)).all(axis=-1)
+
+    def square_walkable(self, locations):
+        """Walkability of (N, num_agents, 2) locations in their own kitchen, out of bounds is not walkable"""
+        inbounds = self.locations_inbounds(locations)
+        clipped = np.clip(locations, 0, (self.width - 1, self.height - 1))
+        world_idx = np.arange(len(self.worlds))[:, None]
+        return inbounds & self.walkable[world_idx, clipped[..., 0], clipped[..., 1]]
+
+    def check_inbounds(self, actions):
+        valid = (actions == 0) | (actions == 5) | self.locations_inbounds(self.target_locations(actions))
+        return np.where(valid, actions, 0)
+
+    def check_collisions(self, actions):
+        target_locations = self.target_locations(actions)
+        walkable = self.square_walkable(target_locations)
+        end_locations = np.where(walkable[..., None], target_locations, self.agent_locations)
+        # an active agent collides if any other active agent of its kitchen ends up on the same square, the agents
+        # are counted on a scratch grid in one pass and the grid is cleared again afterwards
+        world_idx = np.broadcast_to(np.arange(len(self.worlds))[:, None], self.active_agents.shape)
+        squares = (world_idx[self.active_agents], end_locations[self.active_agents][:, 0],
+                   end_locations[self.active_agents][:, 1])
+        np.add.at(self.end_counts, squares, 1)
+        collided = np.zeros_like(self.active_agents)
+        collided[self.active_agents] = self.end_counts[squares] > 1
+        self.end_counts[squares] = 0
+        return np.where(collided & walkable, 0, actions)
+
+    def step(self, actions):
+        """
+        :param actions: (N, num_agents) array, actions of inactive agents are ignored
+        :return: the ChangeLog of every world
+        """
+        self.sync()
+        actions = np.asarray(actions, dtype=np.int64).reshape(len(self.worlds), self.num_agents)
+        actions = np.where(self.active_agents, actions, 0)
+        for world in self.worlds:
+            world.prepare_step()
+            world.changes = ChangeLog()
+            world.status_changed = [False] * self.num_agents
+            for agent in world.compute_active_agents():
+                agent.interacts_with = []
+
+        turning = self.active_agents & np.isin(actions, self.walk_actions)
+        self.agent_orientations = np.where(turning, actions, self.agent_orientations)
+        for world_idx, agent_idx in zip(*np.nonzero(turning)):
+            self.worlds[world_idx].agents[agent_idx].change_orientation(int(actions[world_idx, agent_idx]))
+
+        actions = self.check_collisions(self.check_inbounds(actions))
+        target_locations = self.target_locations(actions)
+        target_walkable = self.square_walkable(target_locations)
+        if self.action_scheme == ActionScheme1:
+            walking = self.active_agents & np.isin(actions, self.walk_actions) & target_walkable
+            interacting = self.active_agents & np.isin(actions, self.interact_actions)
+        else:
+            # scheme 3 also "walks" onto its own square on a no-op, but only bumping into a square interacts
+            walking = self.active_agents & target_walkable
+            interacting = self.active_agents & (actions != 0) & ~target_walkable
+
+        self.agent_locations = np.where(walking[..., None], target_locations, self.agent_locations)
+        # kitchens finish their step one after the other, like stepping them in a loop would
+        for world_idx, world in enumerate(self.worlds):
+            for agent_idx in np.flatnonzero(walking[world_idx] | interacting[world_idx]):
+                agent = world.agents[agent_idx]
+                action = int(actions[world_idx, agent_idx])
+                if self.action_scheme == ActionScheme1:
+                    if walking[world_idx, agent_idx]:
+                        action_scheme1.resolve_walking_action(world, agent, action)
+                    else:
+                        action_scheme1.resolve_interaction(world, agent, action)
+                else:
+                    if walking[world_idx, agent_idx]:
+                        action_scheme3.resolve_walking_action(world, agent, action)
+                    else:
+                        target_location = tuple(int(coord) for coord in target_locations[world_idx, agent_idx])
+                        action_scheme3.resolve_interaction(world, agent, target_location)
+            world.progress_world()
+            world.resolve_linked_interactions()
+            world.handle_agent_spawn()
+            world.relevant_agents = world.compute_relevant_agents()
+            if any(world.status_changed):
+                self.active_agents[world_idx] = world.active_agents
+                self.agent_locations[world_idx] = [agent.location for agent in world.agents]
+        return [world.changes for world in self.worlds]
@@ -0,0 +1,53 @@
+class ChangeLog:
+    """
+    Record of what changed in a CookingWorld during one world_step.
+
+    created/deleted hold objects in the order they were created/deleted. moved maps an object to its
+    (old_location, new_location) and state_changed maps an object to {attribute: (old_value, new_value)}, where the
+    old value is the one from the start of the step. Entries that end the step where they started are dropped.
+    content_changed holds the containers whose content was added to or taken from, as an ordered set.
+    """
+
+    def __init__(self):
+        self.created = []
+        self.deleted = []
+        self.moved = {}
+        self.state_changed = {}
+        self.content_changed = {}
+
+    def record_creation(self, objects):
+        self.created.extend(objects)
+
+    def record_deletion(self, objects):
+        self.deleted.extend(objects)
+
+    def record_move(self, obj, old_location, new_location):
+        old_location = self.moved[obj][0] if obj in self.moved else old_location
+        if old_location == new_location:
+            self.moved.pop(obj, None)
+        else:
+            self.moved[obj] = (old_location, new_location)
+
+    def record_state_change(self, obj, attribute, old_value, new_value):
+        changes = self.state_changed.setdefault(obj, {})
+        old_value = changes[attribute][0] if attribute in changes else old_value
+        if old_value == new_value:
+            changes.pop(attribute, None)
+            if not changes:
+                del self.state_changed[obj]
+        else:
+            changes[attribute] = (old_value, new_value)
+
+    def record_content_change(self, obj):
+        self.content_changed[obj] = None
+
+    def changed_objects(self):
+        """
+        :return: every object that was created, deleted, moved, changed state or changed content, in that order,
+        without duplicates
+        """
+        return list(dict.fromkeys(self.created + self.deleted + list(self.moved) + list(self.state_changed) +
+                                  list(self.content_changed)))
+
+    def __bool__(self):
+        return bool(self.created or self.deleted or self.moved or self.state_changed or self.content_changed)
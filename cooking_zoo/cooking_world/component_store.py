@@ -0,0 +1,86 @@
+from enum import Enum
+import numpy as np
+
+
+class ComponentStore:
+    """
+    NumPy columns of the state of the objects and agents of a world, one row per object, read from the objects when
+    the store is built. Objects come in world_objects order, then the agents.
+
+    The objects keep their state in their own slots, a store is a snapshot for code that reads many objects at once,
+    e.g. RecipeProgram, and goes stale once the world changes. Enum states are stored as the index of the member in
+    its Enum, -1 marks attributes an object doesn't have.
+    """
+
+    STATE_COLUMNS = ("chop_state", "blend_state", "toast_state", "microwave_state", "boil_state", "fry_state",
+                     "current_progress", "toggle", "status", "free")
+    # class -> type id, shared by all stores
+    TYPE_IDS = {}
+
+    def __init__(self, world, columns=STATE_COLUMNS):
+        """:param columns: names of the STATE_COLUMNS to read, the others are left out"""
+        self.objects = world.get_object_list() + world.agents
+        self.rows = {obj: row for row, obj in enumerate(self.objects)}
+        self.size = len(self.objects)
+        self.location = np.array([obj.location for obj in self.objects], dtype=np.int64).reshape(self.size, 2)
+        self.walkable = np.array([obj.walkable for obj in self.objects], dtype=bool)
+        self.type_id = np.array([self.TYPE_IDS.setdefault(type(obj), len(self.TYPE_IDS)) for obj in self.objects],
+                                dtype=np.int64)
+        self.unique_id = np.array([-1 if obj.unique_id is None else obj.unique_id for obj in self.objects],
+                                  dtype=np.int64)
+        encode = self.encode
+        self.columns = {name: np.array([encode(getattr(obj, name, None)) for obj in self.objects], dtype=np.int32)
+                        for name in columns}
+        self._parent = None
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, obj):
+        return obj in self.rows
+
+    def __getitem__(self, name):
+        if name == "parent":
+            return self.parent
+        if name in ("location", "walkable", "type_id", "unique_id"):
+            return getattr(self, name)
+        return self.columns[name]
+
+    @property
+    def parent(self):
+        """Row of the container holding each movable object, -1 if it isn't held by one"""
+        if self._parent is None:
+            self._parent = np.full(self.size, -1, dtype=np.int32)
+            for row, container in enumerate(self.objects):
+                for content in getattr(container, "content", ()):
+                    content_row = self.rows.get(content)
+                    # floors also list the agents that stood on them, only movable objects are held
+                    if content_row is not None and content.movable:
+                        self._parent[content_row] = row
+        return self._parent
+
+    def row(self, obj):
+        return self.rows[obj]
+
+    def rows_of(self, objects):
+        return np.fromiter((self.rows[obj] for obj in objects), dtype=np.int64)
+
+    @staticmethod
+    def encode(value):
+        if value is None:
+            return -1
+        if isinstance(value, Enum):
+            return enum_index(value)
+        return int(value)
+
+
+# member -> index of the member in its Enum, see enum_index
+_enum_indices = {}
+
+
+def enum_index(member):
+    index = _enum_indices.get(member)
+    if index is None:
+        index = list(type(member)).index(member)
+        _enum_indices[member] = index
+    return index
@@ -1,4 +1,5 @@
 from enum import Enum
+import colorsys
 
 
 class ChopFoodStates(Enum):
@@ -63,5 +64,14 @@ TOMATO_INIT_STATE = ChopFoodStates.FRESH
 LETTUCE_INIT_STATE = ChopFoodStates.FRESH
 
 
+# agents past the named colours get generated ones, see agent_color
+AGENT_COLORS = ['blue', 'magenta', 'yellow', 'green']
 
 
+def agent_color(index):
+    if index < len(AGENT_COLORS):
+        return AGENT_COLORS[index]
+    # golden ratio steps spread the hues of any number of agents around the colour wheel
+    hue = (index - len(AGENT_COLORS)) * 0.618033988749895 % 1.0
+    red, green, blue = colorsys.hsv_to_rgb(hue, 0.65, 0.95)
+    return f"#{int(red * 255):02x}{int(green * 255):02x}{int(blue * 255):02x}"
@@ -1,12 +1,21 @@
 from collections import defaultdict
+import itertools
+import random
 from cooking_zoo.cooking_world.world_objects import *
 from cooking_zoo.cooking_world.actions import *
 from cooking_zoo.cooking_world.cooking_action_util import action_scheme1, action_scheme2, action_scheme3, \
     action_scheme1_twohand
-from cooking_zoo.cooking_world.engine import load_level, parsing
+from cooking_zoo.cooking_world.engine import load_level, parsing, layout_pool
+from cooking_zoo.cooking_world.change_log import ChangeLog
+from cooking_zoo.cooking_world.world_state import WorldState, encode_object, encode_value, decode_object, \
+    copy_objects, save_object
 import numpy as np
 
 
+# loaded worlds shared by every world of the process that loads the same level, see CookingWorld.level_template
+LEVEL_TEMPLATES = {}
+
+
 class CookingWorld:
 
     LEFT = 1
@@ -19,56 +28,382 @@ class CookingWorld:
                       (RIGHT, ActionScheme2.TURN_RIGHT): DOWN, (LEFT, ActionScheme2.TURN_RIGHT): UP,
                       (UP, ActionScheme2.TURN_RIGHT): RIGHT, (DOWN, ActionScheme2.TURN_RIGHT): LEFT}
 
-    COLORS = ['blue', 'magenta', 'yellow', 'green']
+    COLORS = AGENT_COLORS
+
+    # location offset of each walking action, indexed by action, as in get_target_location
+    ACTION_OFFSETS = np.array([(0, 0), (-1, 0), (1, 0), (0, 1), (0, -1)])
 
     def __init__(self, action_scheme_class=ActionScheme1, meta_file="", recipes=None, agent_respawn_rate=0.0,
-                 grace_period=20, agent_despawn_rate=0.0):
+                 grace_period=20, agent_despawn_rate=0.0, share_level_templates=False, layout_pool=None):
         self.agents = []
         self.agent_store = []
         self.agent_spawn_locations = []
         self.width = 0
         self.height = 0
         self.world_objects = defaultdict(list)
-        self.abstract_index = defaultdict(list)
+        # abstract class -> insertion ordered dict used as a set of objects
+        self.abstract_index = defaultdict(dict)
+        self.location_index = defaultdict(list)
+        self.active_objects = {}  # processing/progressing objects that need ticking, used as an ordered set
+        self.pending_linked_objects = {}  # linked objects with links to process, used as an ordered set
+        self.changed_containers = {}  # content objects whose content changed since the last tick
+        self.changes = ChangeLog()  # what changed during the last world_step
+        self.shared_objects = set()  # objects shared with forks, copied before this world changes them
+        self.next_unique_id = 0
+        self._location_order = {}
+        self._type_order = {}
+        self._insertion_counter = 0
+        self.walkable_grid = np.zeros((0, 0), dtype=bool)
+        self.agent_occupancy = np.zeros((0, 0), dtype=np.int32)
         self.action_scheme = action_scheme_class
-        self.init_world = None
-        self.init_agents = []
+        self.init_world = None  # the level as it was loaded, see reset_level()
+        self.level_objects = set()  # objects and agents of init_world
+        self.init_state = None  # get_state() of the level as it was loaded, once it can't be reset in place anymore
+        self.undo_log = None  # object -> attributes it had when the episode started, see log_tiles()
+        self.meta_file = meta_file
         self.meta_object_information = load_level.load_meta_file(meta_file)
         self.loaded_object_counter = defaultdict(int)
         self.recipes = recipes or []
         self.agent_respawn_rate = agent_respawn_rate
         self.agent_despawn_rate = agent_despawn_rate
         self.grace_period = grace_period
+        # load levels from a process-wide template instead of parsing them. The objects are placed once per template,
+        # so every such world gets the same layout unless a layout_pool is set, then there is a template per layout
+        self.share_level_templates = share_level_templates
+        # file of pre-generated layouts to load one of instead of drawing the positions, see engine.layout_pool
+        self.layout_pool = layout_pool
+        self.layout = None  # locations to place the objects of the level on, see parsing.draw_location
+        self.placements = []  # locations the objects of the level were placed on
         self.agent_grace_period = []
         self.active_agents = []
         self.status_changed = []
         self.relevant_agents = []
         self.to_delete: list[Object] = []  # cooking_env will want to check these
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # objects are copied without their world reference, hand them this copy
+        for tile in self.location_index.values():
+            for obj in tile:
+                obj.world = self
+        for agent in self.agents:
+            agent.world = self
+        self.shared_objects = set()
+
+    def fork(self):
+        """
+        :return: child world that shares all objects with this one. Either world copies the shared objects of a tile
+        the first time a step could change them, so neither sees the changes of the other.
+        """
+        objects = list(itertools.chain(self.get_object_list(), self.agents))
+        for obj in objects:
+            obj.world = None
+        self.shared_objects.update(objects)
+        # objects shared with the child can't be reset in place anymore
+        self.stop_undo_log()
+        return self.copy()
+
+    def share(self):
+        """:return: child world that shares all objects with this one like fork(), but this world is left as it is"""
+        child = self.copy()
+        child.shared_objects = set(itertools.chain(self.get_object_list(), self.agents))
+        return child
+
+    def copy(self):
+        """:return: world with the same objects as this one and its own copies of everything that indexes them"""
+        child = CookingWorld.__new__(CookingWorld)
+        child.__dict__.update(self.__dict__)
+        child.agents = list(self.agents)
+        child.agent_store = list(self.agent_store)
+        child.world_objects = defaultdict(list, {name: list(obj_list) for name, obj_list in self.world_objects.items()})
+        child.abstract_index = defaultdict(dict, {cls: dict(objs) for cls, objs in self.abstract_index.items()})
+        child.location_index = defaultdict(list, {location: list(tile)
+                                                  for location, tile in self.location_index.items()})
+        child.active_objects = dict(self.active_objects)
+        child.pending_linked_objects = dict(self.pending_linked_objects)
+        child.changed_containers = dict(self.changed_containers)
+        child._location_order = dict(self._location_order)
+        child._type_order = dict(self._type_order)
+        child.walkable_grid = self.walkable_grid.copy()
+        child.agent_occupancy = self.agent_occupancy.copy()
+        child.loaded_object_counter = self.loaded_object_counter.copy()
+        child.active_agents = list(self.active_agents)
+        child.agent_grace_period = list(self.agent_grace_period)
+        child.status_changed = list(self.status_changed)
+        child.relevant_agents = list(self.relevant_agents)
+        child.to_delete = list(self.to_delete)
+        child.changes = ChangeLog()
+        child.shared_objects = set(self.shared_objects)
+        return child
+
+    def prepare_step(self):
+        """Unshare and log for reset_level() the objects the next world_step could change"""
+        if not self.shared_objects and self.undo_log is None:
+            return
+        locations = self.step_tiles()
+        self.unshare_tiles(locations)
+        self.log_tiles(locations)
+
+    def step_tiles(self):
+        """:return: the tiles a world_step could change: around active agents, of agents and of busy objects"""
+        locations = set()
+        for agent in self.compute_active_agents():
+            locations.update((agent.location[0] + dx, agent.location[1] + dy) for dx, dy in self.ACTION_OFFSETS)
+        locations.update(agent.location for agent in self.agents)
+        locations.update(obj.location for obj in self.active_objects)
+        content_objects = self.abstract_index[ContentObject]
+        locations.update(obj.location for obj in self.changed_containers
+                         if obj in content_objects and self.free_outdated(obj))
+        return locations
+
+    def tile_objects(self, locations, select):
+        """
+        :return: ordered set of the objects on `locations` that `select` returns True for, the ones linked to them and
+        the agents standing there
+        """
+        locations = set(locations)
+        pending = list(locations)
+        selected = {}
+        while pending:
+            for obj in self.location_index.get(pending.pop(), ()):
+                if obj not in selected and select(obj):
+                    selected[obj] = None
+                    for linked in getattr(obj, "linked_objects", ()):
+                        if linked.location not in locations:
+                            locations.add(linked.location)
+                            pending.append(linked.location)
+        selected.update((agent, None) for agent in self.agents if agent.location in locations and select(agent))
+        return selected
+
+    def log_tiles(self, locations):
+        """Save the attributes of the objects of the level on `locations` that weren't saved yet this episode"""
+        if self.undo_log is None:
+            return
+        undo_log = self.undo_log
+        level_objects = self.level_objects
+        for obj in self.tile_objects(locations, lambda obj: obj not in undo_log and obj in level_objects):
+            undo_log[obj] = save_object(obj)
+
+    def log_object(self, obj):
+        """Save the attributes of `obj` if it is an object of the level that wasn't saved yet this episode"""
+        if obj not in self.undo_log and obj in self.level_objects:
+            self.undo_log[obj] = save_object(obj)
+
+    def unshare_tiles(self, locations):
+        """Copy the shared objects on `locations`, the agents standing there and everything linked to them"""
+        if not self.shared_objects:
+            return
+        shared = self.tile_objects(locations, self.shared_objects.__contains__)
+        if not shared:
+            return
+        copies = copy_objects(shared)
+        abstract_classes = set()
+        for obj, copied in copies.items():
+            self.shared_objects.discard(obj)
+            copied.world = self
+            if isinstance(obj, Agent):
+                self.agents[self.agents.index(obj)] = copied
+                if obj in self.agent_store:
+                    self.agent_store[self.agent_store.index(obj)] = copied
+                continue
+            obj_list = self.world_objects[type(obj).__name__]
+            obj_list[obj_list.index(obj)] = copied
+            tile = self.location_index[obj.location]
+            tile[tile.index(obj)] = copied
+            self._location_order[copied] = self._location_order.pop(obj)
+            abstract_classes.update(get_abstract_classes(type(obj)))
+        for abstract_class in abstract_classes:
+            self.abstract_index[abstract_class] = {copies.get(obj, obj): None
+                                                   for obj in self.abstract_index[abstract_class]}
+        self.active_objects = {copies.get(obj, obj): None for obj in self.active_objects}
+        self.pending_linked_objects = {copies.get(obj, obj): None for obj in self.pending_linked_objects}
+        self.changed_containers = {copies.get(obj, obj): None for obj in self.changed_containers}
+        self.relevant_agents = [copies.get(agent, agent) for agent in self.relevant_agents]
+
+    def get_state(self) -> WorldState:
+        """
+        :return: compact, picklable snapshot of everything that can change while stepping, see set_state()
+        """
+        objects = {}
+        for obj in itertools.chain(self.get_object_list(), self.agents, self.to_delete):
+            objects[obj.unique_id] = encode_object(obj)
+        return WorldState(objects=objects,
+                          world_objects=tuple((type_name, tuple(obj.unique_id for obj in obj_list))
+                                              for type_name, obj_list in self.world_objects.items()),
+                          agents=tuple(agent.unique_id for agent in self.agents),
+                          to_delete=tuple(obj.unique_id for obj in self.to_delete),
+                          changed_containers=tuple(obj.unique_id for obj in self.changed_containers),
+                          active_agents=tuple(self.active_agents),
+                          status_changed=tuple(self.status_changed),
+                          agent_grace_period=tuple(self.agent_grace_period),
+                          next_unique_id=self.next_unique_id)
+
+    def set_state(self, state: WorldState):
+        """
+        Restore the world in place from a get_state() snapshot of this level. Objects that still exist are reused,
+        objects that were deleted since are brought back and objects created since are dropped.
+        """
+        # the objects of the level may get replaced
+        self.stop_undo_log()
+        current = {obj.unique_id: obj for obj in itertools.chain(self.get_object_list(), self.agents, self.to_delete)}
+        objects = {}
+        for unique_id, (cls, _) in state.objects.items():
+            obj = current.get(unique_id)
+            objects[unique_id] = obj if type(obj) is cls and obj not in self.shared_objects else cls.__new__(cls)
+        for unique_id, (_, attributes) in state.objects.items():
+            decode_object(objects[unique_id], attributes, objects)
+        for agent in self.agents:
+            agent.world = None
+        self.world_objects = defaultdict(list)
+        for type_name, unique_ids in state.world_objects:
+            self.world_objects[type_name] = [objects[unique_id] for unique_id in unique_ids]
+        self.agents = [objects[unique_id] for unique_id in state.agents]
+        self.to_delete = [objects[unique_id] for unique_id in state.to_delete]
+        self.active_agents = list(state.active_agents)
+        self.status_changed = list(state.status_changed)
+        self.agent_grace_period = list(state.agent_grace_period)
+        self.next_unique_id = state.next_unique_id
+        self.relevant_agents = self.compute_relevant_agents()
+        self.index_locations()
+        self.abstract_index = defaultdict(dict)
+        self.index_objects()
+        self.changed_containers = dict.fromkeys(objects[unique_id] for unique_id in state.changed_containers)
+        self.index_grids()
+        self.changes = ChangeLog()
+        self.shared_objects = set()
+
     def add_object(self, obj):
         self.world_objects[type(obj).__name__].append(obj)
+        self._register_location(obj)
+        self.update_walkable(obj)
 
     def delete_object(self, obj):
         self.world_objects[type(obj).__name__].remove(obj)
+        self._unregister_location(obj)
+
+    def index_locations(self):
+        """Rebuild the per-tile index from scratch, e.g. after world_objects was replaced wholesale."""
+        for tile in self.location_index.values():
+            for obj in tile:
+                obj.world = None
+        self.location_index = defaultdict(list)
+        self._location_order = {}
+        self._type_order = {}
+        self._insertion_counter = 0
+        for obj_list in self.world_objects.values():
+            for obj in obj_list:
+                self._register_location(obj)
+
+    def index_grids(self):
+        """Build the walkability and agent occupancy grids, indexed by [x, y], from the loaded level."""
+        self.walkable_grid = np.zeros((self.width, self.height), dtype=bool)
+        self.agent_occupancy = np.zeros((self.width, self.height), dtype=np.int32)
+        for obj in self.get_object_list():
+            if isinstance(obj, StaticObject):
+                self.update_walkable(obj)
+        for agent in self.agents:
+            agent.world = self
+            self.agent_occupancy[agent.location] += 1
+
+    def update_object_location(self, obj, old_location, new_location):
+        if old_location == new_location:
+            return
+        self.changes.record_move(obj, old_location, new_location)
+        if isinstance(obj, Agent):
+            self.agent_occupancy[old_location] -= 1
+            self.agent_occupancy[new_location] += 1
+            return
+        self.location_index[old_location].remove(obj)
+        self._insert_at_location(obj, new_location)
+
+    def state_changed(self, obj, attribute, old_value, new_value):
+        self.changes.record_state_change(obj, attribute, old_value, new_value)
+        if attribute == "toggle":
+            self.update_active(obj)
+        elif attribute == "walkable":
+            self.update_walkable(obj)
+        elif attribute == "button_pressed":
+            self.update_pending_links(obj)
+
+    def update_walkable(self, obj):
+        if isinstance(obj, StaticObject) and self.in_bounds(obj.location):
+            self.walkable_grid[obj.location] = obj.walkable
+
+    def in_bounds(self, location):
+        return 0 <= location[0] < self.walkable_grid.shape[0] and 0 <= location[1] < self.walkable_grid.shape[1]
+
+    def agent_at(self, location):
+        return self.in_bounds(location) and self.agent_occupancy[location] > 0
+
+    def _register_location(self, obj):
+        # tiles are kept in world_objects iteration order: by type first, then by insertion
+        type_rank = self._type_order.setdefault(type(obj).__name__, len(self._type_order))
+        self._location_order[obj] = (type_rank, self._insertion_counter)
+        self._insertion_counter += 1
+        self._insert_at_location(obj, obj.location)
+        obj.world = self
+
+    def _unregister_location(self, obj):
+        self.location_index[obj.location].remove(obj)
+        del self._location_order[obj]
+        obj.world = None
+
+    def _insert_at_location(self, obj, location):
+        tile = self.location_index[location]
+        order = self._location_order[obj]
+        idx = len(tile)
+        while idx > 0 and self._location_order[tile[idx - 1]] > order:
+            idx -= 1
+        tile.insert(idx, obj)
 
     def index_objects(self):
         for type_name, obj_list in self.world_objects.items():
-            for abstract_class in ABSTRACT_GAME_CLASSES:
-                if issubclass(StringToClass[type_name], abstract_class):
-                    self.abstract_index[abstract_class].extend(obj_list)
+            for abstract_class in get_abstract_classes(StringToClass[type_name]):
+                self.abstract_index[abstract_class].update(dict.fromkeys(obj_list))
+        self.active_objects = {}
+        for obj in self.abstract_index[ProcessingObject]:
+            self.update_active(obj)
+        for obj in self.abstract_index[ProgressingObject]:
+            self.update_active(obj)
+        self.pending_linked_objects = {}
+        for obj in self.abstract_index[LinkedObject]:
+            self.update_pending_links(obj)
+        self.changed_containers = dict.fromkeys(self.abstract_index[ContentObject])
 
     def delete_from_index(self, obj):
-        for abstract_class in ABSTRACT_GAME_CLASSES:
-            if isinstance(obj, abstract_class):
-                try:
-                    self.abstract_index[abstract_class].remove(obj)
-                except ValueError:
-                    pass
+        for abstract_class in get_abstract_classes(type(obj)):
+            self.abstract_index[abstract_class].pop(obj, None)
+        self.active_objects.pop(obj, None)
+        self.pending_linked_objects.pop(obj, None)
+        self.changed_containers.pop(obj, None)
 
     def add_to_index(self, obj):
-        for abstract_class in ABSTRACT_GAME_CLASSES:
-            if isinstance(obj, abstract_class):
-                self.abstract_index[abstract_class].append(obj)
+        for abstract_class in get_abstract_classes(type(obj)):
+            self.abstract_index[abstract_class][obj] = None
+        if isinstance(obj, (ProcessingObject, ProgressingObject)):
+            self.update_active(obj)
+        if isinstance(obj, LinkedObject):
+            self.update_pending_links(obj)
+        if isinstance(obj, ContentObject):
+            self.content_changed(obj)
+
+    def update_active(self, obj):
+        if obj.is_active():
+            self.active_objects[obj] = None
+        else:
+            self.active_objects.pop(obj, None)
+
+    def update_pending_links(self, obj):
+        if obj.has_pending_links():
+            self.pending_linked_objects[obj] = None
+        else:
+            self.pending_linked_objects.pop(obj, None)
+
+    def content_changed(self, obj):
+        self.changed_containers[obj] = None
+        self.changes.record_content_change(obj)
+        if isinstance(obj, (ProcessingObject, ProgressingObject)):
+            self.update_active(obj)
 
     def get_object_list(self):
         object_list = []
@@ -81,29 +416,44 @@ class CookingWorld:
 
         obj_list_deleted = []
         obj_list_created = []
-        for obj in self.abstract_index[ProcessingObject]:
-            creation, deletion = obj.process()
-            obj_list_deleted.extend(deletion)
-            obj_list_created.extend(creation)
-        for obj in self.abstract_index[ProgressingObject]:
-            creation, deletion = obj.progress()
-            obj_list_deleted.extend(deletion)
-            obj_list_created.extend(creation)
-        for obj in self.abstract_index[ContentObject]:
-            if len(obj.content) > 0:
-                for c in obj.content:
+        # only active objects can change anything, tick them in abstract_index order
+        active_objects = sorted(self.active_objects, key=self._location_order.__getitem__)
+        for obj in active_objects:
+            if isinstance(obj, ProcessingObject):
+                creation, deletion = obj.process()
+                obj_list_deleted.extend(deletion)
+                obj_list_created.extend(creation)
+        for obj in active_objects:
+            if isinstance(obj, ProgressingObject):
+                creation, deletion = obj.progress()
+                obj_list_deleted.extend(deletion)
+                obj_list_created.extend(creation)
+        for obj in active_objects:
+            self.content_changed(obj)
+        content_objects = self.abstract_index[ContentObject]
+        for obj in self.changed_containers:
+            if obj in content_objects and self.free_outdated(obj):
+                # only the last object put on is free
+                last = len(obj.content) - 1
+                for idx, c in enumerate(obj.content):
                     if hasattr(c, "free"):
-                        c.free = False
-                if hasattr(obj.content[-1], 'free'):
-                    obj.content[-1].free = True
+                        c.free = idx == last
+        self.changed_containers = {}
 
         self.to_delete.extend(obj_list_deleted)  # TODO check this came from a Deliversquare?
         self.handle_object_deletion(obj_list_deleted)
         self.handle_object_creation(obj_list_created)
 
+    @staticmethod
+    def free_outdated(obj):
+        last = len(obj.content) - 1
+        return any(c.free != (idx == last) for idx, c in enumerate(obj.content) if hasattr(c, "free"))
+
     def resolve_linked_interactions(self):
-        for obj in self.abstract_index[LinkedObject]:
+        # only pressed switches change anything, process them in abstract_index order
+        for obj in sorted(self.pending_linked_objects, key=self._location_order.__getitem__):
             obj.process_linked_objects()
+            self.update_pending_links(obj)
 
     def perform_agent_actions(self, agents, actions):
         if self.action_scheme == ActionScheme1:
@@ -118,6 +468,11 @@ class CookingWorld:
             raise Exception("No valid Action Scheme Found")
 
     def world_step(self, actions):
+        """
+        :return: ChangeLog of everything created, deleted, moved or changed during this step, also kept in `changes`
+        """
+        self.prepare_step()
+        self.changes = ChangeLog()
         agents = self.compute_active_agents()
         self.status_changed = [False] * len(self.agents)
         assert len(agents) == len(actions)
@@ -126,10 +481,11 @@ class CookingWorld:
         self.resolve_linked_interactions()
         self.handle_agent_spawn()
         self.relevant_agents = self.compute_relevant_agents()
+        return self.changes
 
     def resolve_primary_interaction(self, agent: Agent, arm=None):
         interaction_location = self.get_target_location(agent, agent.orientation)
-        if any([agent.location == interaction_location for agent in self.agents]):
+        if self.agent_at(interaction_location):
             return
         dynamic_objects = self.get_objects_at(interaction_location, DynamicObject)
         static_object = self.get_objects_at(interaction_location, StaticObject)[0]
@@ -158,6 +514,7 @@ class CookingWorld:
                     if object_to_grab in static_object.content:
                         agent.grab(object_to_grab, arm)
                         static_object.content.remove(object_to_grab)
+                        self.content_changed(static_object)
                         agent.interacts_with = [object_to_grab]
         # holding something that can maybe be merged
         elif not agent.holding_empty(arm):
@@ -165,7 +522,7 @@ class CookingWorld:
 
     def resolve_interaction_pick_up_special(self, agent: Agent, arm=None):
         interaction_location = self.get_target_location(agent, agent.orientation)
-        if any([agent.location == interaction_location for agent in self.agents]):
+        if self.agent_at(interaction_location):
             return
         dynamic_objects = self.get_objects_at(interaction_location, DynamicObject)
         if agent.holding_has_free(arm) and dynamic_objects:
@@ -173,6 +530,7 @@ class CookingWorld:
             if len(content_obj_l) == 1:
                 try:
                     obj = content_obj_l[0].content.pop(-1)  # pick the last object put on
+                    self.content_changed(content_obj_l[0])
                     agent.grab(obj, arm)
                 except IndexError:
                     pass
@@ -183,25 +541,100 @@ class CookingWorld:
 
     def resolve_execute_action(self, agent: Agent, arm=None):
         interaction_location = self.get_target_location(agent, agent.orientation)
-        if any([agent.location == interaction_location for agent in self.agents]):
+        if self.agent_at(interaction_location):
             return
         static_object = self.get_objects_at(interaction_location, StaticObject)[0]
         if isinstance(static_object, ActionObject):
             obj_list_created, obj_list_deleted, action_executed = static_object.action()
             if action_executed:
                 agent.interacts_with = [static_object]
+            self.content_changed(static_object)
             self.handle_object_deletion(obj_list_deleted)
             self.handle_object_creation(obj_list_created)
 
+    def primary_interaction_possible(self, agent: Agent, location, arm=None):
+        """Mirrors the early exits of resolve_primary_interaction"""
+        if not self.in_bounds(location) or self.agent_at(location):
+            return False
+        return not agent.holding_empty(arm) or bool(self.get_objects_at(location, DynamicObject))
+
+    def pick_up_special_possible(self, agent: Agent, location, arm=None):
+        """Mirrors the early exits of resolve_interaction_pick_up_special"""
+        if not self.in_bounds(location) or self.agent_at(location) or not agent.holding_has_free(arm):
+            return False
+        content_obj_l = self.filter_obj(self.get_objects_at(location, DynamicObject), ContentObject)
+        return len(content_obj_l) == 1 and bool(content_obj_l[0].content)
+
+    def execute_action_possible(self, location):
+        """Mirrors the early exits of resolve_execute_action"""
+        if not self.in_bounds(location) or self.agent_at(location):
+            return False
+        return isinstance(self.get_objects_at(location, StaticObject)[0], ActionObject)
+
+    def bump_interaction_possible(self, agent: Agent, location):
+        """Action scheme 3 interacts with a square by walking into it, see action_scheme3.resolve_interaction"""
+        if not self.in_bounds(location):
+            return False
+        static_object = self.get_objects_at(location, StaticObject)[0]
+        dynamic_objects = self.get_objects_at(location, DynamicObject)
+        if isinstance(static_object, ActionObject) and (
+                any(not d.done() for d in dynamic_objects) or static_object.status == ActionObjectState.READY):
+            return self.execute_action_possible(location)
+        return self.primary_interaction_possible(agent, location)
+
+    def valid_action_mask(self, agent: Agent, num_actions=None):
+        """
+        :return: boolean array over the actions of the action scheme, True for the actions of `agent` that can change
+        something. Walking into a wall still turns the agent, so it's only masked if the agent already faces it, except
+        in action scheme 3 where bumping into a wall is only valid if it interacts. Interactions are masked if the
+        targeted square has nothing to interact with or another agent on it.
+        """
+        scheme = self.action_scheme
+        mask = np.zeros(num_actions or len(scheme.ACTIONS), dtype=bool)
+
+        def allow(action, valid):
+            if action < len(mask):
+                mask[action] = valid
+
+        allow(scheme.NO_OP, True)
+        facing = self.get_target_location(agent, agent.orientation)
+        if scheme == ActionScheme2:
+            allow(ActionScheme2.TURN_LEFT, True)
+            allow(ActionScheme2.TURN_RIGHT, True)
+            allow(ActionScheme2.WALK, self.square_walkable(facing))
+        else:
+            for action in scheme.WALK_ACTIONS:
+                target_location = self.get_target_location(agent, action)
+                if self.square_walkable(target_location):
+                    allow(action, True)
+                elif scheme == ActionScheme3:
+                    allow(action, self.bump_interaction_possible(agent, target_location))
+                else:
+                    allow(action, agent.orientation != action)
+        if scheme.INTERACT_ACTIONS:
+            allow(scheme.INTERACT_PRIMARY, self.primary_interaction_possible(agent, facing))
+            allow(scheme.INTERACT_PICK_UP_SPECIAL, self.pick_up_special_possible(agent, facing))
+            allow(scheme.EXECUTE_ACTION, self.execute_action_possible(facing))
+        if scheme == ActionScheme1_twohand:
+            for arm, offset in enumerate([scheme.ARM1_OFFSET, scheme.ARM2_OFFSET]):
+                if arm < len(agent.holding):
+                    allow(scheme.INTERACT_PRIMARY + offset, self.primary_interaction_possible(agent, facing, arm))
+                    allow(scheme.INTERACT_PICK_UP_SPECIAL + offset,
+                          self.pick_up_special_possible(agent, facing, arm))
+                    allow(scheme.EXECUTE_ACTION + offset, self.execute_action_possible(facing))
+        return mask
+
     def handle_object_deletion(self, objects_to_delete):
         for obj in objects_to_delete:
             self.delete_object(obj)
             self.delete_from_index(obj)
+        self.changes.record_deletion(objects_to_delete)
 
     def handle_object_creation(self, objects_to_create):
         for obj in objects_to_create:
             self.add_object(obj)
             self.add_to_index(obj)
+        self.changes.record_creation(objects_to_create)
 
     @staticmethod
     def get_target_location(agent, action):
@@ -223,56 +656,44 @@ class CookingWorld:
     def filter_obj(self, objects: List, obj_type):
         return [obj for obj in objects if isinstance(obj, obj_type)]
 
+    def get_target_locations(self, agents, actions):
+        """Vectorized get_target_location, returns the agent locations and their targets as (n, 2) arrays"""
+        locations = np.array([agent.location for agent in agents], dtype=np.int64).reshape(-1, 2)
+        actions = np.asarray(actions, dtype=np.int64).reshape(-1)
+        walk = (actions > 0) & (actions < len(self.ACTION_OFFSETS))
+        return locations, locations + self.ACTION_OFFSETS[np.where(walk, actions, 0)]
+
+    def locations_inbounds(self, locations):
+        return (locations >= 0).all(axis=1) & (locations < (self.width, self.height)).all(axis=1)
+
     def check_inbounds(self, agents, actions):
-        cleaned_actions = []
-        for agent, action in zip(agents, actions):
-            if action == 0 or action == 5:
-                cleaned_actions.append(action)
-                continue
-            target_location = self.get_target_location(agent, action)
-            if target_location[0] > self.width - 1 or target_location[0] < 0:
-                action = 0
-            if target_location[1] > self.height - 1 or target_location[1] < 0:
-                action = 0
-            cleaned_actions.append(action)
-        return cleaned_actions
+        _, target_locations = self.get_target_locations(agents, actions)
+        actions = np.asarray(actions).reshape(-1)
+        valid = (actions == 0) | (actions == 5) | self.locations_inbounds(target_locations)
+        return np.where(valid, actions, 0).tolist()
 
     def check_collisions(self, agents, actions):
-        collision_actions = []
-        target_locations = []
-        walkable = []
-        for agent, action in zip(agents, actions):
-            target_location = self.get_target_location(agent, action)
-            target_walkable = self.square_walkable(target_location)
-            end_location = target_location if target_walkable else agent.location
-            target_locations.append(end_location)
-            walkable.append(target_walkable)
-        for idx, (action, target_location, target_walkable) in enumerate(zip(actions, target_locations, walkable)):
-            if target_location in target_locations[:idx] + target_locations[idx+1:] and target_walkable:
-                collision_actions.append(0)
-            else:
-                collision_actions.append(action)
-        return collision_actions
+        locations, target_locations = self.get_target_locations(agents, actions)
+        walkable = np.zeros(len(target_locations), dtype=bool)
+        inbounds = self.locations_inbounds(target_locations)
+        walkable[inbounds] = self.walkable_grid[target_locations[inbounds, 0], target_locations[inbounds, 1]]
+        end_locations = np.where(walkable[:, None], target_locations, locations)
+        # an agent collides if any other agent ends up on the same square, counted in one pass over the agents
+        flat_end_locations = (end_locations[:, 0] * self.height + end_locations[:, 1]).tolist()
+        counts = defaultdict(int)
+        for flat_end_location in flat_end_locations:
+            counts[flat_end_location] += 1
+        collided = np.array([counts[flat_end_location] > 1 for flat_end_location in flat_end_locations], dtype=bool)
+        return np.where(collided & walkable, 0, np.asarray(actions).reshape(-1)).tolist()
 
     def square_walkable(self, location):
-        objects = self.get_objects_at(location, StaticObject)
-        if len(objects) != 1:
-            raise Exception(f"Not exactly one static object at location: {location}")
-        return objects[0].walkable
+        return self.in_bounds(location) and bool(self.walkable_grid[location])
 
     def get_abstract_object_at(self, location, object_type):
-        return [obj for obj in self.abstract_index[object_type] if obj.location == location]
+        return self.get_objects_at(location, object_type)
 
     def get_objects_at(self, location, object_type=object):
-        located_objects = []
-        for obj_class_string, objects in self.world_objects.items():
-            obj_class = StringToClass[obj_class_string]
-            if not issubclass(obj_class, object_type):
-                continue
-            for obj in objects:
-                if obj.location == location:
-                    located_objects.append(obj)
-        return located_objects
+        return [obj for obj in self.location_index.get(location, ()) if isinstance(obj, object_type)]
 
     def attempt_merge(self, agent: Agent, dynamic_objects: List[DynamicObject], target_location, static_object,
                       arm=None):
@@ -281,6 +702,7 @@ class CookingWorld:
             acceptable_agent_holding: Object = agent.find_appropriate_holding(content_obj[0].accepts, arm)
             if acceptable_agent_holding:
                 content_obj[0].add_content(acceptable_agent_holding)
+                self.content_changed(content_obj[0])
                 agent.put_down(target_location, acceptable_agent_holding)
                 agent.interacts_with.append(content_obj[0])
         elif agent.find_appropriate_holding(lambda obj: isinstance(obj, ContentObject), arm) and dynamic_objects:
@@ -292,30 +714,135 @@ class CookingWorld:
                 dynamic_objects[pick_index].move_to(agent.location)
                 agent.interacts_with.append(dynamic_objects[pick_index])
                 static_object.content.remove(dynamic_objects[pick_index])
+                self.content_changed(acceptable_agent_holding)
+                self.content_changed(static_object)
         elif isinstance(static_object, ContentObject):
             acceptable_agent_holding = agent.find_appropriate_holding(static_object.accepts, arm)
             if acceptable_agent_holding:
                 static_object.add_content(acceptable_agent_holding)
+                self.content_changed(static_object)
                 agent.put_down(target_location, acceptable_agent_holding)
                 agent.interacts_with.append(static_object)
         else:
             return False
 
+    def new_object_id(self):
+        unique_id = self.next_unique_id
+        self.next_unique_id += 1
+        return unique_id
+
     def load_level(self, level, num_agents, agents_arms):
-        reset_world_counter()
-        load_level.load_level(self, level, num_agents, agents_arms)
+        """Load `level` the first time, afterwards put the level back the way it was loaded, see reset_level()"""
+        if self.share_level_templates:
+            layout = None if self.layout_pool is None else \
+                random.randrange(len(layout_pool.load_layout_pool(self.layout_pool, num_agents)))
+            self.instantiate(self.level_template(level, self.meta_file, num_agents, agents_arms, self.layout_pool,
+                                                 layout))
+        elif self.init_world is not None:
+            self.reset_level()
+        else:
+            if self.layout_pool is not None:
+                layouts = layout_pool.load_layout_pool(self.layout_pool, num_agents)
+                self.layout = layouts[random.randrange(len(layouts))]
+            load_level.load_level(self, level, num_agents, agents_arms)
+            self.changes = ChangeLog()
+            self.shared_objects = set()
+            self.keep_init_world()
+            self.start_undo_log()
+
+    def reset_level(self):
+        """
+        Put the level back the way it was loaded in place. Only the objects in `undo_log` get their attributes back,
+        objects created since are dropped and the indexes are copied from `init_world`. Objects are saved to the log
+        before the first change of their location or of a StateAttribute, wherever it happens, and world_step() saves
+        the tiles it could change, for the lists like `content` it changes in place. A world that was forked or
+        set_state() since falls back to set_state(init_state).
+        """
+        if self.undo_log is None:
+            self.set_state(self.init_state)
+            self.keep_init_world()
+        else:
+            for obj, attributes in self.undo_log.items():
+                decode_object(obj, attributes, {})
+            self.adopt(self.init_world.copy())
+            for obj in self.undo_log:
+                obj.world = self
+            self.changes = ChangeLog()
+        self.start_undo_log()
+
+    def keep_init_world(self):
+        """Keep the level as it is now to put it back with reset_level()"""
+        self.init_world = self.copy()
+        self.level_objects = set(itertools.chain(self.get_object_list(), self.agents))
+
+    def start_undo_log(self):
+        self.undo_log = {}
+        self.log_tiles(agent.location for agent in self.agents)
+
+    def stop_undo_log(self):
+        """Keep the level as it was loaded as `init_state` instead, for a world whose objects get shared or replaced"""
+        if self.undo_log is None:
+            return
+        self.init_state = self.init_world.get_state()
+        for obj, attributes in self.undo_log.items():
+            self.init_state.objects[obj.unique_id] = type(obj), {name: encode_value(value)
+                                                                 for name, value in attributes.items()}
+        self.undo_log = None
+
+    @staticmethod
+    def level_template(level, meta_file, num_agents, agents_arms, pool=None, layout=None):
+        """
+        :param pool: layout pool file to place the objects by, see engine.layout_pool
+        :param layout: index of the layout of `pool` to place them on
+        :return: world with the level loaded, parsed once per process and shared by every world instantiated from it.
+        Without a pool, the objects are placed randomly once, so all of these worlds get the same placement.
+        Don't step or change it.
+        """
+        key = (level, meta_file, num_agents, tuple(agents_arms), pool, layout)
+        template = LEVEL_TEMPLATES.get(key)
+        if template is None:
+            template = CookingWorld(meta_file=meta_file)
+            if pool is not None:
+                template.layout = layout_pool.load_layout_pool(pool, num_agents)[layout]
+            load_level.load_level(template, level, num_agents, agents_arms)
+            # the objects belong to the worlds instantiated from the template, it never steps them
+            for obj in itertools.chain(template.get_object_list(), template.agents):
+                obj.world = None
+            LEVEL_TEMPLATES[key] = template
+        return template
+
+    def instantiate(self, template):
+        """
+        Load the level of `template` into this world without parsing or copying it: the objects are shared
+        copy-on-write like with fork(), only the agents are copied right away so they keep their identity.
+        """
+        self.adopt(template.share())
+        self.agent_grace_period = [self.grace_period] * len(self.agents)
+        self.unshare_tiles(agent.location for agent in self.agents)
+
+    def adopt(self, world):
+        """Take over the level of `world`, a fork or copy of another world, but keep the settings of this one"""
+        settings = {name: self.__dict__[name] for name in ("action_scheme", "meta_file", "meta_object_information",
+                                                           "recipes", "agent_respawn_rate", "agent_despawn_rate",
+                                                           "grace_period", "share_level_templates", "layout_pool",
+                                                           "init_world", "level_objects", "init_state", "undo_log")}
+        self.__dict__.update(world.__dict__)
+        self.__dict__.update(settings)
 
     def handle_agent_spawn(self):
+        num_active = self.active_agents.count(True)
         for i in range(len(self.active_agents)):
             if self.agent_grace_period[i] > 0:
                 self.agent_grace_period[i] -= 1
             else:
                 # active = self.active_agents[i]
-                if self.active_agents.count(True) > 1 and self.active_agents[i] \
+                if num_active > 1 and self.active_agents[i] \
                    and np.random.random() < self.agent_despawn_rate:
                     self.despawn_agent(i)
+                    num_active -= not self.active_agents[i]
                 elif not self.active_agents[i] and np.random.random() < self.agent_respawn_rate:
                     self.respawn_agent(i)
+                    num_active += 1
 
     def despawn_agent(self, index):
         if self.agents[index].holding:
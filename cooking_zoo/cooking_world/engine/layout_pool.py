@@ -0,0 +1,62 @@
+"""
+Pools of layouts pre-generated for levels with random positions or optional objects.
+
+A layout is where parsing placed every object of a level, in the order it drew them. A world given a layout pool loads
+one of its layouts picked at random instead of drawing the positions, so it gets a layout from the same distribution
+at the cost of a level without random positions. Generate a pool with
+
+    python -m cooking_zoo.cooking_world.engine.layout_pool coop_test example 2 1000 coop_test_2_agents.npz
+"""
+import argparse
+import random
+
+import numpy as np
+
+from cooking_zoo.cooking_world.engine import load_level
+
+
+def generate_layout_pool(level, meta_file, num_agents, size, file, agents_arms=None, seed=None):
+    """
+    Load `level` `size` times and save the layouts into `file` as a (size, placements, 2) int16 array, the location of
+    every object in the order it was placed and -1 for optional objects that were left out.
+    """
+    from cooking_zoo.cooking_world.cooking_world import CookingWorld
+    agents_arms = [1] * num_agents if agents_arms is None else agents_arms
+    if seed is not None:
+        random.seed(seed)
+    layouts = []
+    for _ in range(size):
+        world = CookingWorld(meta_file=meta_file)
+        load_level.load_level(world, level, num_agents, agents_arms)
+        layouts.append([(-1, -1) if location is None else location for location in world.placements])
+    layouts = np.array(layouts, dtype=np.int16).reshape(size, -1, 2)
+    with open(file, "wb") as pool_file:
+        np.savez_compressed(pool_file, layouts=layouts, num_agents=num_agents)
+
+
+def read_layout_pool(file):
+    with np.load(file) as pool:
+        return pool["layouts"], int(pool["num_agents"])
+
+
+def load_layout_pool(file, num_agents):
+    """:return: (size, placements, 2) array of the layouts in `file`, see load_level.load_cached()"""
+    layouts, pool_agents = load_level.load_cached(str(load_level.Path(file).resolve()), read_layout_pool)
+    if pool_agents != num_agents:
+        raise ValueError(f"Layout pool {file} was generated for {pool_agents} agents, not {num_agents}")
+    return layouts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-generate random layouts of a level for CookingWorld's "
+                                                 "layout_pool.")
+    parser.add_argument("level")
+    parser.add_argument("meta_file")
+    parser.add_argument("num_agents", type=int)
+    parser.add_argument("size", type=int, help="number of layouts")
+    parser.add_argument("file", help="file to write the pool to")
+    parser.add_argument("--agents_arms", type=int, nargs="+")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    generate_layout_pool(args.level, args.meta_file, args.num_agents, args.size, args.file, args.agents_arms,
+                         args.seed)
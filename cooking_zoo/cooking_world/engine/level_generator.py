@@ -0,0 +1,156 @@
+"""
+Procedural kitchens of any size for scaling experiments, written as level and meta files like the shipped ones.
+
+The kitchen is a grid of rooms surrounded by counters. Neighbouring rooms are joined by corridors through the counter
+wall between them, so every floor tile can be reached from every other. Appliances, dispensers and dynamic objects
+are put on counters next to the floor, agents are spread over the rooms. Generate a kitchen with
+
+    python -m cooking_zoo.cooking_world.engine.level_generator 100 100 8 big_kitchen.json big_kitchen_meta.json \
+        --rooms 3 3
+"""
+from collections import deque
+import argparse
+import json
+import random
+
+from cooking_zoo.cooking_world.world_objects import StringToClass
+
+DEFAULT_APPLIANCES = {"Cutboard": 1, "Blender": 1, "Toaster": 1, "Pot": 1, "Pan": 1, "Deliversquare": 1}
+DEFAULT_DISPENSERS = {"PlateDispenser": 1, "TomatoDispenser": 1, "LettuceDispenser": 1, "OnionDispenser": 1,
+                      "BreadDispenser": 1}
+NEIGHBOURS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+def split(start, length, parts):
+    """:return: (first, last) of `parts` spans of `start`..`start + length - 1`, separated by single wall tiles"""
+    space = length - (parts - 1)
+    spans = []
+    for part in range(parts):
+        first = start + part * space // parts + part
+        last = start + (part + 1) * space // parts + part - 1
+        spans.append((first, last))
+    return spans
+
+
+def open_corridor(grid, rng, span, corridor_width, tile):
+    """Turn `corridor_width` tiles of the wall next to `span` into floor, tile(offset) gives the wall tile"""
+    first, last = span
+    start = rng.randint(first, last - corridor_width + 1)
+    for offset in range(start, start + corridor_width):
+        x, y = tile(offset)
+        grid[y][x] = " "
+
+
+def reachable_floor(grid, start):
+    width, height = len(grid[0]), len(grid)
+    seen = {start}
+    pending = deque([start])
+    while pending:
+        x, y = pending.popleft()
+        for dx, dy in NEIGHBOURS:
+            neighbour = (x + dx, y + dy)
+            if 0 <= neighbour[0] < width and 0 <= neighbour[1] < height and grid[neighbour[1]][neighbour[0]] == " " \
+                    and neighbour not in seen:
+                seen.add(neighbour)
+                pending.append(neighbour)
+    return seen
+
+
+def generate_level(width, height, num_agents, appliances=None, dispensers=None, dynamic_objects=None, rooms=(1, 1),
+                   corridor_width=1, seed=None):
+    """
+    :param rooms: (columns, rows) of the grid of rooms
+    :param corridor_width: tiles of the wall between two neighbouring rooms that are opened up
+    :return: (level, meta) objects in the format of the files in cooking_zoo/utils/level and utils/meta_files
+    """
+    appliances = DEFAULT_APPLIANCES if appliances is None else appliances
+    dispensers = DEFAULT_DISPENSERS if dispensers is None else dispensers
+    dynamic_objects = dynamic_objects or {}
+    for name in list(appliances) + list(dispensers) + list(dynamic_objects):
+        if name not in StringToClass:
+            raise ValueError(f"Unknown object {name}")
+    columns, rows = rooms
+    if columns < 1 or rows < 1 or width - 2 - (columns - 1) < 2 * columns or height - 2 - (rows - 1) < 2 * rows:
+        raise ValueError(f"{columns}x{rows} rooms don't fit a {width}x{height} kitchen")
+    rng = random.Random(seed)
+
+    grid = [["-"] * width for _ in range(height)]
+    x_spans = split(1, width - 2, columns)
+    y_spans = split(1, height - 2, rows)
+    if corridor_width < 1 or corridor_width > min(last - first + 1 for first, last in x_spans + y_spans):
+        raise ValueError(f"Corridors of width {corridor_width} don't fit the rooms")
+    for first_x, last_x in x_spans:
+        for first_y, last_y in y_spans:
+            for y in range(first_y, last_y + 1):
+                grid[y][first_x:last_x + 1] = [" "] * (last_x - first_x + 1)
+    for (_, last_x), _ in zip(x_spans, x_spans[1:]):
+        for y_span in y_spans:
+            open_corridor(grid, rng, y_span, corridor_width, lambda offset: (last_x + 1, offset))
+    for (_, last_y), _ in zip(y_spans, y_spans[1:]):
+        for x_span in x_spans:
+            open_corridor(grid, rng, x_span, corridor_width, lambda offset: (offset, last_y + 1))
+
+    floor = reachable_floor(grid, (x_spans[0][0], y_spans[0][0]))
+    # counters an agent can face from the floor
+    usable = [(x, y) for y in range(height) for x in range(width)
+              if grid[y][x] == "-" and any((x + dx, y + dy) in floor for dx, dy in NEIGHBOURS)]
+    rng.shuffle(usable)
+    placed = [name for objects in (appliances, dispensers) for name, count in objects.items() for _ in range(count)]
+    dynamic = [name for name, count in dynamic_objects.items() for _ in range(count)]
+    if len(placed) + len(dynamic) > len(usable):
+        raise ValueError(f"{len(placed) + len(dynamic)} objects don't fit the {len(usable)} counters next to the floor")
+    static_objects = [{name: {"COUNT": 1, "X_POSITION": [x], "Y_POSITION": [y]}}
+                      for name, (x, y) in zip(placed, usable)]
+    dynamic_objects = [{name: {"COUNT": 1, "X_POSITION": [x], "Y_POSITION": [y]}}
+                       for name, (x, y) in zip(dynamic, usable[len(placed):])]
+
+    room_spans = [(x_span, y_span) for y_span in y_spans for x_span in x_spans]
+    agents = []
+    for idx, ((first_x, last_x), (first_y, last_y)) in enumerate(room_spans):
+        count = len(range(idx, num_agents, len(room_spans)))
+        if count > (last_x - first_x + 1) * (last_y - first_y + 1):
+            raise ValueError(f"{count} agents don't fit a room of the kitchen")
+        if count:
+            agents.append({"MAX_COUNT": count, "X_POSITION": list(range(first_x, last_x + 1)),
+                           "Y_POSITION": list(range(first_y, last_y + 1))})
+
+    level = {"LEVEL_LAYOUT": "\n".join("".join(row) for row in grid), "STATIC_OBJECTS": static_objects,
+             "DYNAMIC_OBJECTS": dynamic_objects, "AGENTS": agents, "DYNAMIC_EXCLUDED_POSITIONS": []}
+    counts = {"Agent": num_agents, "Counter": sum(row.count("-") for row in grid) - len(placed)}
+    for name in placed + dynamic:
+        counts[name] = counts.get(name, 0) + 1
+    meta = [{name: count} for name, count in counts.items()]
+    return level, meta
+
+
+def write_level(level_file, meta_file, *args, **kwargs):
+    """Write the level and meta objects of generate_level(*args, **kwargs) to `level_file` and `meta_file`"""
+    level, meta = generate_level(*args, **kwargs)
+    with open(level_file, "w") as json_file:
+        json.dump(level, json_file, indent=2)
+    with open(meta_file, "w") as json_file:
+        json.dump(meta, json_file, indent=2)
+
+
+def parse_counts(pairs):
+    return {pair.split("=")[0]: int(pair.split("=")[1]) for pair in pairs} if pairs is not None else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the level and meta file of a kitchen of any size.")
+    parser.add_argument("width", type=int)
+    parser.add_argument("height", type=int)
+    parser.add_argument("num_agents", type=int)
+    parser.add_argument("level_file")
+    parser.add_argument("meta_file")
+    parser.add_argument("--appliances", nargs="*", help="counts like Cutboard=2 Blender=1")
+    parser.add_argument("--dispensers", nargs="*", help="counts like PlateDispenser=2 TomatoDispenser=1")
+    parser.add_argument("--dynamic_objects", nargs="*", help="counts like Plate=2 Tomato=1")
+    parser.add_argument("--rooms", type=int, nargs=2, default=(1, 1), metavar=("COLUMNS", "ROWS"))
+    parser.add_argument("--corridor_width", type=int, default=1)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    write_level(args.level_file, args.meta_file, args.width, args.height, args.num_agents,
+                appliances=parse_counts(args.appliances), dispensers=parse_counts(args.dispensers),
+                dynamic_objects=parse_counts(args.dynamic_objects), rooms=tuple(args.rooms),
+                corridor_width=args.corridor_width, seed=args.seed)
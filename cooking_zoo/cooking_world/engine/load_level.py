@@ -1,25 +1,57 @@
 from cooking_zoo.cooking_world.engine import parsing
 from pathlib import Path
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from cooking_zoo.cooking_world.abstract_classes import LinkedObject
 
 import os.path
 import json
-import copy
 
 
-def load_new_style_level(world, level_name, num_agents, agents_arms):
-    if level_name.endswith(".json"):
-        file = level_name
+# resolved path -> (mtime, content) of the level, meta and layout pool files read so far, least recently used first
+FILE_CACHE = OrderedDict()
+FILE_CACHE_SIZE = 128
+
+
+def resolve_file(name, directory):
+    """:return: resolved path of a `.json` file name or of a file name in cooking_zoo/utils/`directory`"""
+    if name.endswith(".json"):
+        file = Path(name)
     else:
-        my_path = os.path.realpath(__file__)
-        dir_name = os.path.dirname(my_path)
-        path = Path(dir_name)
-        file = path.parent.parent / f"utils/level/{level_name}.json"
+        file = Path(os.path.realpath(__file__)).parent.parent.parent / f"utils/{directory}/{name}.json"
+    return str(file.resolve())
+
+
+def load_cached(file, read):
+    """
+    :return: read(file), read again only once the mtime of `file` changed. The content is shared by everyone loading
+    the file, don't change it.
+    """
+    mtime = os.stat(file).st_mtime_ns
+    cached = FILE_CACHE.get(file)
+    if cached is not None and cached[0] == mtime:
+        FILE_CACHE.move_to_end(file)
+        return cached[1]
+    content = read(file)
+    FILE_CACHE[file] = (mtime, content)
+    FILE_CACHE.move_to_end(file)
+    while len(FILE_CACHE) > FILE_CACHE_SIZE:
+        FILE_CACHE.popitem(last=False)
+    return content
+
+
+def read_json(file):
     with open(file) as json_file:
-        level_object = json.load(json_file)
-        json_file.close()
-        world.level_object = level_object
+        return json.load(json_file)
+
+
+def load_json(file):
+    """:return: parsed content of `file`, see load_cached()"""
+    return load_cached(file, read_json)
+
+
+def load_new_style_level(world, level_name, num_agents, agents_arms):
+    level_object = load_json(resolve_file(level_name, "level"))
+    world.level_object = level_object
     parsing.parse_level_layout(world, level_object)
     parsing.parse_static_objects(world, level_object)
     parsing.parse_dynamic_objects(world, level_object)
@@ -27,45 +59,33 @@ def load_new_style_level(world, level_name, num_agents, agents_arms):
 
 
 def cross_link(world):
-    linked_objects = world.abstract_index[LinkedObject]
-    for obj in linked_objects:
-        for obj2 in linked_objects:
-            if obj == obj2:
-                continue
-            if obj.linked_group_id == obj2.linked_group_id:
+    groups = defaultdict(list)
+    for obj in world.abstract_index[LinkedObject]:
+        groups[obj.linked_group_id].append(obj)
+    for obj in world.abstract_index[LinkedObject]:
+        for obj2 in groups[obj.linked_group_id]:
+            if obj != obj2:
                 obj.link(obj2)
 
 
 def load_meta_file(meta_file):
-    if meta_file.endswith(".json"):
-        file = meta_file
-    else:
-        my_path = os.path.realpath(__file__)
-        dir_name = os.path.dirname(my_path)
-        path = Path(dir_name)
-        file = path.parent.parent / f"utils/meta_files/{meta_file}.json"
-    with open(file) as json_file:
-        meta_object = json.load(json_file)
-        json_file.close()
+    meta_object = load_json(resolve_file(meta_file, "meta_files"))
     # dictionaries in python are ordered since 3.7
     meta_dict = {list(dic.keys())[0]: list(dic.values())[0] for dic in meta_object}
     return meta_dict
 
 
 def load_level(world, level, num_agents, agents_arms):
-    if world.init_world is not None:
-        world.world_objects = defaultdict(list)
-        world.abstract_index = defaultdict(list)
-        world.world_objects.update(copy.deepcopy(world.init_world))
-        world.agents = copy.deepcopy(world.init_agents)
-    else:
-        load_new_style_level(world, level, num_agents, agents_arms)
-        world.abstract_index = defaultdict(list)
-        world.init_world = defaultdict(list)
-        world.init_world.update(copy.deepcopy(world.world_objects))
-        world.init_agents = copy.deepcopy(world.agents)
+    world.next_unique_id = 0
+    world.placements = []
+    load_new_style_level(world, level, num_agents, agents_arms)
+    if world.layout is not None and len(world.placements) != len(world.layout):
+        raise ValueError(f"Layout with {len(world.layout)} placements doesn't fit level {level} with {num_agents} "
+                         f"agents")
+    world.abstract_index = defaultdict(dict)
     world.active_agents = [True] * len(world.agents)
     world.status_changed = [False] * len(world.agents)
     world.relevant_agents = world.compute_relevant_agents()
     world.index_objects()
+    world.index_grids()
     cross_link(world)
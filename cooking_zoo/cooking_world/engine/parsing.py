@@ -9,159 +9,167 @@ def parse_level_layout(world, level_object):
     for y, line in enumerate(iter(level_layout.splitlines())):
         for x, char in enumerate(line):
             if char == "-":
-                counter = Counter(location=(x, y))
+                counter = Counter(location=(x, y), unique_id=world.new_object_id())
                 world.add_object(counter)
             else:
-                floor = Floor(location=(x, y))
+                floor = Floor(location=(x, y), unique_id=world.new_object_id())
                 world.add_object(floor)
     world.width = x + 1
     world.height = y + 1
 
 
+def candidate_locations(world, x_positions, y_positions, is_valid, description):
+    """
+    :return: every location of `x_positions` x `y_positions` that `is_valid` accepts, in the order of the positions.
+    A position listed several times gives its locations as many times, so they are drawn that much more often.
+    Every location is checked against the level layout, not only the ones that end up drawn.
+    """
+    candidates = []
+    for x in x_positions:
+        for y in y_positions:
+            if x < 0 or y < 0 or x >= world.width or y >= world.height:
+                raise ValueError(f"Position {x} {y}{description} is out of bounds set by the level layout!")
+            if is_valid((int(x), int(y))):
+                candidates.append((int(x), int(y)))
+    return candidates
+
+
+def draw_location(world, spec, candidates):
+    """
+    :return: location for the next object of `spec`, taken out of `candidates`, or None for an optional object that is
+    left out. Every draw is recorded in `world.placements`, a world given a `layout` replays that record instead.
+    """
+    if world.layout is not None:
+        if len(world.placements) >= len(world.layout):
+            raise ValueError("Layout has fewer placements than the level")
+        x, y = world.layout[len(world.placements)]
+        location = None if x < 0 else (int(x), int(y))
+        if location is not None:
+            if location not in candidates:
+                raise ValueError(f"Layout places {spec} on {location}, which is not a valid position in the level")
+            remove_location(candidates, location)
+    elif is_optional_skipped(spec):
+        location = None
+    else:
+        location = pop_random(candidates, spec)
+    world.placements.append(location)
+    return location
+
+
+def pop_random(candidates, spec):
+    """Remove a random location, with all its copies, from `candidates` and return it, keeping the others in order"""
+    if not candidates:
+        raise ValueError(f"Can't find valid position for object: {spec}")
+    location = candidates.pop(random.randrange(len(candidates)))
+    remove_location(candidates, location)
+    return location
+
+
+def remove_location(candidates, location):
+    candidates[:] = [candidate for candidate in candidates if candidate != location]
+
+
+def is_optional_skipped(spec):
+    """Rolled once per object, so an object of `spec` is placed with probability OPTIONAL whatever its tiles are"""
+    return "OPTIONAL" in spec and spec["OPTIONAL"] <= random.random()
+
+
 def parse_static_objects(world, level_object):
     static_objects = level_object["STATIC_OBJECTS"]
+
+    def is_valid(location):
+        return any(isinstance(obj, (Counter, Floor)) for obj in world.get_objects_at(location, StaticObject))
+
     for static_object in static_objects:
         name = list(static_object.keys())[0]
-        for idx in range(static_object[name]["COUNT"]):
-            time_out = 0
-            while True:
-                try:
-                    optional = static_object[name]["OPTIONAL"]
-                    if optional <= random.random():
-                        break
-                except KeyError:
-                    pass
-                x = random.sample(static_object[name]["X_POSITION"], 1)[0]
-                y = random.sample(static_object[name]["Y_POSITION"], 1)[0]
-                if x < 0 or y < 0 or x > world.width or y > world.height:
-                    raise ValueError(f"Position {x} {y} of object {name} is out of bounds set by the level layout!")
-                static_objects_loc = world.get_objects_at((x, y), StaticObject)
-                counter = [obj for obj in static_objects_loc if isinstance(obj, Counter)]
-                floor = [obj for obj in static_objects_loc if isinstance(obj, Floor)]
-                if counter:
-                    if len(counter) != 1:
-                        raise ValueError("Too many counter in one place detected during initialization")
-                    if world.meta_object_information[name] <= world.loaded_object_counter[name]:
-                        raise ValueError(f"Too many {name} objects loaded")
-                    world.loaded_object_counter[name] += 1
-                    world.delete_object(counter[0])
-                    obj = StringToClass[name](location=(x, y))
-                    try:
-                        for key in static_object[name]["ATTRIBUTES"].keys():
-                            setattr(obj, key, static_object[name][key])
-                    except KeyError:
-                        pass
-                    world.add_object(obj)
-                    break
-                elif floor:
-                    if len(floor) != 1:
-                        raise ValueError("Too many floor tiles in one place detected during initialization")
-                    if world.meta_object_information[name] <= world.loaded_object_counter[name]:
-                        raise ValueError(f"Too many {name} objects loaded")
-                    world.loaded_object_counter[name] += 1
-                    world.delete_object(floor[0])
-                    obj = StringToClass[name](location=(x, y))
-                    try:
-                        for key in static_object[name]["ATTRIBUTES"].keys():
-                            setattr(obj, key, static_object[name][key])
-                    except KeyError:
-                        pass
-                    world.add_object(obj)
-                    break
-                else:
-                    time_out += 1
-                    if time_out > 10000:
-                        raise ValueError(f"Can't find valid position for object: "
-                                         f"{static_object} in {time_out} steps")
-                    continue
+        spec = static_object[name]
+        # placing an object replaces the counter or floor of its tile, so no later one of this spec can go there
+        candidates = candidate_locations(world, spec["X_POSITION"], spec["Y_POSITION"], is_valid,
+                                         f" of object {name}")
+        for idx in range(spec["COUNT"]):
+            location = draw_location(world, spec, candidates)
+            if location is None:
+                continue
+            static_objects_loc = world.get_objects_at(location, StaticObject)
+            counter = [obj for obj in static_objects_loc if isinstance(obj, Counter)]
+            floor = [obj for obj in static_objects_loc if isinstance(obj, Floor)]
+            if counter and len(counter) != 1:
+                raise ValueError("Too many counter in one place detected during initialization")
+            if not counter and len(floor) != 1:
+                raise ValueError("Too many floor tiles in one place detected during initialization")
+            if world.meta_object_information[name] <= world.loaded_object_counter[name]:
+                raise ValueError(f"Too many {name} objects loaded")
+            world.loaded_object_counter[name] += 1
+            world.delete_object((counter or floor)[0])
+            obj = StringToClass[name](location=location, unique_id=world.new_object_id())
+            try:
+                for key in spec["ATTRIBUTES"].keys():
+                    setattr(obj, key, spec[key])
+            except KeyError:
+                pass
+            world.add_object(obj)
 
 
 def parse_dynamic_objects(world, level_object):
     dynamic_objects = level_object["DYNAMIC_OBJECTS"]
     dynamic_excluded_positions = level_object["DYNAMIC_EXCLUDED_POSITIONS"]
+
+    def is_valid(location):
+        return len(world.get_objects_at(location, Counter)) == 1 and \
+            not world.get_objects_at(location, DynamicObject) and list(location) not in dynamic_excluded_positions
+
     for dynamic_object in dynamic_objects:
         name = list(dynamic_object.keys())[0]
-        for idx in range(dynamic_object[name]["COUNT"]):
-            time_out = 0
-            while True:
-                try:
-                    optional = dynamic_object[name]["OPTIONAL"]
-                    if optional <= random.random():
-                        break
-                except KeyError:
-                    pass
-
-                x = random.sample(dynamic_object[name]["X_POSITION"], 1)[0]
-                y = random.sample(dynamic_object[name]["Y_POSITION"], 1)[0]
-                if x < 0 or y < 0 or x > world.width or y > world.height:
-                    raise ValueError(f"Position {x} {y} of object {name} is out of bounds set by the level layout!")
-                static_objects_loc = world.get_objects_at((x, y), Counter)
-                dynamic_objects_loc = world.get_objects_at((x, y), DynamicObject)
-
-                if len(static_objects_loc) == 1 and not dynamic_objects_loc and [x,
-                                                                                 y] not in dynamic_excluded_positions:
-                    if world.meta_object_information[name] <= world.loaded_object_counter[name]:
-                        raise ValueError(f"Too many {name} objects loaded")
-                    world.loaded_object_counter[name] += 1
-                    obj = StringToClass[name](location=(x, y))
-                    world.add_object(obj)
-                    static_objects_loc[0].add_content(obj)
-                    break
-                else:
-                    time_out += 1
-                    if time_out > 10000:
-                        raise ValueError(f"Can't find valid position for object: "
-                                         f"{dynamic_object} in {time_out} steps")
-                    continue
+        spec = dynamic_object[name]
+        # a tile takes a single dynamic object
+        candidates = candidate_locations(world, spec["X_POSITION"], spec["Y_POSITION"], is_valid,
+                                         f" of object {name}")
+        for idx in range(spec["COUNT"]):
+            location = draw_location(world, spec, candidates)
+            if location is None:
+                continue
+            if world.meta_object_information[name] <= world.loaded_object_counter[name]:
+                raise ValueError(f"Too many {name} objects loaded")
+            world.loaded_object_counter[name] += 1
+            obj = StringToClass[name](location=location, unique_id=world.new_object_id())
+            world.add_object(obj)
+            world.get_objects_at(location, Counter)[0].add_content(obj)
 
 
 def parse_agents(world, level_object, num_agents, agents_arms):
     agent_objects = level_object["AGENTS"]
     agent_idx = 0
+    agent_locations = {agent.location for agent in world.agents}
+
+    def is_valid(location):
+        return location not in agent_locations and world.get_objects_at(location, Floor)
+
     for agent_object in agent_objects:
+        candidates = candidate_locations(world, agent_object["X_POSITION"], agent_object["Y_POSITION"], is_valid,
+                                         " of agent")
         for idx in range(agent_object["MAX_COUNT"]):
             agent_idx += 1
             if agent_idx > num_agents:
                 return
-            time_out = 0
-            while True:
-                x = random.sample(agent_object["X_POSITION"], 1)[0]
-                y = random.sample(agent_object["Y_POSITION"], 1)[0]
-                if x < 0 or y < 0 or x > world.width or y > world.height:
-                    raise ValueError(f"Position {x} {y} of agent is out of bounds set by the level layout!")
-                static_objects_loc = world.get_objects_at((x, y), Floor)
-                if not any([(x, y) == agent.location for agent in world.agents]) and static_objects_loc:
-                    agent = Agent((int(x), int(y)), world.COLORS[len(world.agents)],
-                                  'agent-' + str(len(world.agents) + 1), agents_arms[agent_idx - 1])
-                    name = "Agent"
-                    if world.meta_object_information[name] <= world.loaded_object_counter[name]:
-                        raise ValueError(f"Too many {name} objects loaded")
-                    world.loaded_object_counter[name] += 1
-                    world.agents.append(agent)
-                    world.agent_store.append(agent)
-                    world.agent_grace_period.append(world.grace_period)
-                    world.active_agents.append(True)
-                    world.status_changed.append(False)
-                    world.agent_spawn_locations.append((agent_object["X_POSITION"], agent_object["Y_POSITION"]))
-                    static_objects_loc[0].add_content(agent)
-                    break
-                else:
-                    time_out += 1
-                    if time_out > 1000:
-                        raise ValueError(f"Can't find valid position for agent: {agent_object} in {time_out} steps")
+            location = draw_location(world, agent_object, candidates)
+            agent = Agent(location, agent_color(len(world.agents)), 'agent-' + str(len(world.agents) + 1),
+                          agents_arms[agent_idx - 1], unique_id=world.new_object_id())
+            name = "Agent"
+            if world.meta_object_information[name] <= world.loaded_object_counter[name]:
+                raise ValueError(f"Too many {name} objects loaded")
+            world.loaded_object_counter[name] += 1
+            world.agents.append(agent)
+            agent_locations.add(agent.location)
+            world.agent_store.append(agent)
+            world.agent_grace_period.append(world.grace_period)
+            world.active_agents.append(True)
+            world.status_changed.append(False)
+            world.agent_spawn_locations.append((agent_object["X_POSITION"], agent_object["Y_POSITION"]))
+            world.get_objects_at(location, Floor)[0].add_content(agent)
 
 
 def generate_location(world, x_positions, y_positions):
-    time_out = 0
-    while True:
-        x = random.sample(x_positions, 1)[0]
-        y = random.sample(y_positions, 1)[0]
-        if x < 0 or y < 0 or x > world.width or y > world.height:
-            raise ValueError(f"Position {x} {y} is out of bounds set by the level layout!")
-        static_objects_loc = world.get_objects_at((x, y), Floor)
-        if not any([(x, y) == agent.location for agent in world.agents]) and static_objects_loc:
-            return int(x), int(y)
-        else:
-            time_out += 1
-            if time_out > 1000:
-                raise ValueError(f"Can't find valid position in {time_out} steps")
+    candidates = candidate_locations(world, x_positions, y_positions,
+                                     lambda location: not world.agent_at(location)
+                                     and world.get_objects_at(location, Floor), "")
+    return pop_random(candidates, (x_positions, y_positions))
@@ -6,6 +6,7 @@ from collections.abc import Callable
 import itertools
 
 
+# ids of objects created outside of a world, a CookingWorld hands out its own ids
 world_id_counter = itertools.count(start=0, step=1)
 
 
@@ -14,10 +15,16 @@ def reset_world_counter():
     world_id_counter = itertools.count(start=0, step=1)
 
 
+def allocate_id(unique_id=None):
+    return next(world_id_counter) if unique_id is None else unique_id
+
+
 class Floor(StaticObject, ContentObject):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = ContentObject.SLOTS
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location, True)
 
     def accepts(self, dynamic_object) -> bool:
@@ -56,8 +63,10 @@ class Floor(StaticObject, ContentObject):
 
 class Counter(StaticObject, ContentObject):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = ContentObject.SLOTS
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location, False)
         self.max_content = 1
 
@@ -100,8 +109,10 @@ class Counter(StaticObject, ContentObject):
 
 class Deliversquare(StaticObject, ContentObject):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = ContentObject.SLOTS
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location, False)
 
     def accepts(self, dynamic_object) -> bool:
@@ -144,8 +155,10 @@ class Deliversquare(StaticObject, ContentObject):
 class AbsorbingDeliversquare(StaticObject, ContentObject, ProgressingObject):
     """Backported from drother moop branch"""
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = ContentObject.SLOTS + ("internal_id", "timer", "deliver")
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location, False)
         self.internal_id = 1
         self.timer = 1
@@ -155,6 +168,9 @@ class AbsorbingDeliversquare(StaticObject, ContentObject, ProgressingObject):
     def accepts(self, dynamic_object) -> bool:
         return len(self.content) < self.max_content
 
+    def is_active(self) -> bool:
+        return bool(self.content)
+
     def progress(self):
         if self.content and self.timer > 0:
             self.timer -= 1
@@ -210,8 +226,12 @@ class AbsorbingDeliversquare(StaticObject, ContentObject, ProgressingObject):
 
 class Switch(StaticObject, ContentObject, LinkedObject):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = ContentObject.SLOTS + LinkedObject.SLOTS + ("switch_active", "_button_pressed")
+
+    button_pressed = StateAttribute()
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location, True)
         self.max_content = 1
         self.switch_active = False
@@ -235,6 +255,9 @@ class Switch(StaticObject, ContentObject, LinkedObject):
                 obj.switch_state()
         self.button_pressed = False
 
+    def has_pending_links(self) -> bool:
+        return self.button_pressed
+
     def numeric_state_representation(self):
         return 1,
 
@@ -261,8 +284,10 @@ class Switch(StaticObject, ContentObject, LinkedObject):
 
 class Block(StaticObject, ContentObject, LinkedObject):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = ContentObject.SLOTS + LinkedObject.SLOTS
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location, False)
         self.max_content = 1
 
@@ -272,6 +297,9 @@ class Block(StaticObject, ContentObject, LinkedObject):
     def process_linked_objects(self):
         pass
 
+    def has_pending_links(self) -> bool:
+        return False
+
     def accepts(self, dynamic_objects) -> bool:
         return False
 
@@ -308,8 +336,10 @@ class Block(StaticObject, ContentObject, LinkedObject):
 
 class Cutboard(StaticObject, ActionObject, ContentObject):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = ActionObject.SLOTS + ContentObject.SLOTS
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location, False)
 
         self.max_content = 1
@@ -380,11 +410,16 @@ class Cutboard(StaticObject, ActionObject, ContentObject):
 
 class Blender(StaticObject, ProcessingObject, ContentObject, ToggleObject, ActionObject):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = ContentObject.SLOTS + ToggleObject.SLOTS + ActionObject.SLOTS
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location, False)
         self.max_content = 10
         
+    def is_active(self) -> bool:
+        return self.toggle
+
     def process(self):
         assert len(self.content) <= self.max_content, "Too many Dynamic Objects placed into the Blender"
 
@@ -403,7 +438,7 @@ class Blender(StaticObject, ProcessingObject, ContentObject, ToggleObject, Actio
                     to_delete.append(obj)
 
                 self.content = []
-                to_add = Smoothie(self.location, True)
+                to_add = Smoothie(self.location, True, unique_id=self.new_object_id())
                 
                 self.content.append(to_add)
 
@@ -462,11 +497,16 @@ class Blender(StaticObject, ProcessingObject, ContentObject, ToggleObject, Actio
 
 class Toaster(StaticObject, ProcessingObject, ContentObject, ToggleObject, ActionObject):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = ContentObject.SLOTS + ToggleObject.SLOTS + ActionObject.SLOTS
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location, False)
         self.max_content = 2  # TODO
 
+    def is_active(self) -> bool:
+        return self.toggle
+
     def process(self):
         assert len(self.content) <= self.max_content, "Too many Dynamic Objects placed into the Toaster"
 
@@ -549,11 +589,16 @@ class Toaster(StaticObject, ProcessingObject, ContentObject, ToggleObject, Actio
 
 class Pot(StaticObject, ProcessingObject, ContentObject, ToggleObject, ActionObject):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = ContentObject.SLOTS + ToggleObject.SLOTS + ActionObject.SLOTS
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location, False)
         self.max_content = 1  # TODO
 
+    def is_active(self) -> bool:
+        return self.toggle
+
     def process(self):
         assert len(self.content) <= self.max_content, "Too many Dynamic Objects placed into the Pot"
 
@@ -631,11 +676,16 @@ class Pot(StaticObject, ProcessingObject, ContentObject, ToggleObject, ActionObj
 
 class Pan(StaticObject, ProcessingObject, ContentObject, ToggleObject, ActionObject):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = ContentObject.SLOTS + ToggleObject.SLOTS + ActionObject.SLOTS
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location, False)
         self.max_content = 1  # TODO
 
+    def is_active(self) -> bool:
+        return self.toggle
+
     def process(self):
         assert len(self.content) <= self.max_content, "Too many Dynamic Objects placed into the Pan"
 
@@ -713,8 +763,10 @@ class Pan(StaticObject, ProcessingObject, ContentObject, ToggleObject, ActionObj
 
 class Plate(DynamicObject, ContentObject):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = ContentObject.SLOTS
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location)
         self.max_content = 64
 
@@ -761,8 +813,10 @@ class Plate(DynamicObject, ContentObject):
 
 class Tomato(ChopFood, PanFood):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = ChopFood.SLOTS + PanFood.SLOTS
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location)
 
     def done(self):
@@ -798,8 +852,10 @@ class Tomato(ChopFood, PanFood):
     
 class Pasta(PotFood):
 
-    def __init__(self, location): 
-        unique_id = next(world_id_counter)
+    __slots__ = PotFood.SLOTS
+
+    def __init__(self, location, unique_id=None): 
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location)
 
     def done(self):
@@ -833,8 +889,10 @@ class Pasta(PotFood):
 
 class Egg(PanFood):
 
-    def __init__(self, location): 
-        unique_id = next(world_id_counter)
+    __slots__ = PanFood.SLOTS
+
+    def __init__(self, location, unique_id=None): 
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location)
 
     def done(self):
@@ -869,8 +927,10 @@ class Egg(PanFood):
 
 class Onion(ChopFood):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = ChopFood.SLOTS
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location)
 
     def done(self):
@@ -904,8 +964,10 @@ class Onion(ChopFood):
 
 class Lettuce(ChopFood):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = ChopFood.SLOTS
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location)
 
     def done(self):
@@ -939,10 +1001,12 @@ class Lettuce(ChopFood):
     
 class Smoothie(BlenderFood):
 
-    def __init__(self, location, made_correctly=False):
+    __slots__ = BlenderFood.SLOTS
+
+    def __init__(self, location, made_correctly=False, unique_id=None):
         if not made_correctly:
             raise RuntimeError("Made smoothie outside of blender class. Returning in error.")
-        unique_id = next(world_id_counter)
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location)
 
         self.blend_state = BlenderFoodStates.MASHED
@@ -975,8 +1039,10 @@ class Smoothie(BlenderFood):
 
 class Ice(BlenderFood):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = BlenderFood.SLOTS
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location)
 
     def done(self):
@@ -1007,8 +1073,10 @@ class Ice(BlenderFood):
     
 class Strawberry(BlenderFood):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = BlenderFood.SLOTS
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location)
 
     def done(self):
@@ -1039,8 +1107,10 @@ class Strawberry(BlenderFood):
 
 class Carrot(BlenderFood, ChopFood):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = BlenderFood.SLOTS + ChopFood.SLOTS
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location)
 
     def done(self):
@@ -1079,8 +1149,10 @@ class Carrot(BlenderFood, ChopFood):
 
 class Cucumber(ChopFood):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = ChopFood.SLOTS
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location)
 
     def done(self):
@@ -1112,8 +1184,10 @@ class Cucumber(ChopFood):
 
 class Banana(BlenderFood, ChopFood):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = BlenderFood.SLOTS + ChopFood.SLOTS
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location)
 
     def done(self):
@@ -1149,8 +1223,10 @@ class Banana(BlenderFood, ChopFood):
 
 class Apple(ChopFood):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = ChopFood.SLOTS
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location)
 
     def done(self):
@@ -1185,8 +1261,10 @@ class Apple(ChopFood):
 
 class Watermelon(ChopFood):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = ChopFood.SLOTS
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location)
 
     def done(self):
@@ -1221,8 +1299,10 @@ class Watermelon(ChopFood):
 
 class Bread(ChopFood, ToasterFood):
 
-    def __init__(self, location):
-        unique_id = next(world_id_counter)
+    __slots__ = ChopFood.SLOTS + ToasterFood.SLOTS
+
+    def __init__(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location)
         self.chop_state = ChopFoodStates.FRESH
 
@@ -1233,7 +1313,7 @@ class Bread(ChopFood, ToasterFood):
     def chop(self):
         if self.chop_state == ChopFoodStates.FRESH:
             self.chop_state = ChopFoodStates.CHOPPED
-            new_chopped_bread = Bread(self.location)
+            new_chopped_bread = Bread(self.location, unique_id=self.new_object_id())
             new_chopped_bread.chop_state = ChopFoodStates.CHOPPED
             return [new_chopped_bread], [], True
         else:
@@ -1272,8 +1352,10 @@ class Bread(ChopFood, ToasterFood):
 
 class Agent(Object):
 
-    def __init__(self, location, color, name, num_arms):
-        unique_id = next(world_id_counter)
+    __slots__ = ("_holding_capacity", "_holding", "color", "name", "orientation", "interacts_with")
+
+    def __init__(self, location, color, name, num_arms, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super().__init__(unique_id, location, False, False)
         self._holding_capacity = num_arms
         self._holding: list[None | Object] = [None] * self._holding_capacity
@@ -1406,8 +1488,8 @@ class Agent(Object):
 
 ####### Dispensers Differ from Drother moop in that they add the new object to their content, not agent.holding #######
 def CreateDispenserClass(addedObjectCls, derived_name: str, file_name: str):
-    def init_imp(self, location):
-        unique_id = next(world_id_counter)
+    def init_imp(self, location, unique_id=None):
+        unique_id = allocate_id(unique_id)
         super(cls, self).__init__(unique_id, location, False)
         self.max_content = 1
 
@@ -1419,7 +1501,7 @@ def CreateDispenserClass(addedObjectCls, derived_name: str, file_name: str):
 
     def action_imp(self) -> Tuple[List, List, bool]:
         if len(self.content) < self.max_content:
-            new_obj = addedObjectCls(self.location)
+            new_obj = addedObjectCls(self.location, unique_id=self.new_object_id())
             self.add_content(new_obj)
             new_obj_list = [new_obj]
             deleted_obj_list = []
@@ -1459,6 +1541,7 @@ def CreateDispenserClass(addedObjectCls, derived_name: str, file_name: str):
 
     class_dict = {
         '__module__': __name__,
+        '__slots__': ContentObject.SLOTS + ActionObject.SLOTS,
         '__init__': init_imp,
         'releases': releases_imp,
         'accepts': accepts_imp,
@@ -1494,6 +1577,18 @@ GAME_CLASSES = [m[1] for m in inspect.getmembers(sys.modules[__name__], inspect.
 
 StringToClass = {game_cls.__name__: game_cls for game_cls in GAME_CLASSES}
 ClassToString = {game_cls: game_cls.__name__ for game_cls in GAME_CLASSES}
+ClassToAbstractClasses = {game_cls: [abstract_cls for abstract_cls in ABSTRACT_GAME_CLASSES
+                                     if issubclass(game_cls, abstract_cls)] for game_cls in GAME_CLASSES}
+
+
+def get_abstract_classes(game_cls):
+    """Abstract classes of `game_cls` in ABSTRACT_GAME_CLASSES order, computed once per class"""
+    abstract_classes = ClassToAbstractClasses.get(game_cls)
+    if abstract_classes is None:
+        abstract_classes = [abstract_cls for abstract_cls in ABSTRACT_GAME_CLASSES
+                            if issubclass(game_cls, abstract_cls)]
+        ClassToAbstractClasses[game_cls] = abstract_classes
+    return abstract_classes
 
 
 def get_recursive_content_objects(obj):
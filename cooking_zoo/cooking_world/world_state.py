@@ -0,0 +1,92 @@
+from typing import NamedTuple, Tuple
+from cooking_zoo.cooking_world.abstract_classes import Object, get_slot_names
+
+
+class ObjectRef(NamedTuple):
+    """Stands in for a reference to another object inside a WorldState"""
+    unique_id: int
+
+
+class WorldState(NamedTuple):
+    """
+    Compact, picklable snapshot of a CookingWorld, see CookingWorld.get_state()/set_state().
+
+    objects maps unique_id to (class, attributes) for every object in the world, held by an agent or waiting in
+    to_delete, with references to other objects replaced by ObjectRefs. The other fields hold the unique ids and
+    per-agent lists the world needs to put those objects back in the same order.
+    """
+    objects: dict
+    world_objects: Tuple[Tuple[str, Tuple[int, ...]], ...]
+    agents: Tuple[int, ...]
+    to_delete: Tuple[int, ...]
+    changed_containers: Tuple[int, ...]
+    active_agents: Tuple[bool, ...]
+    status_changed: Tuple[bool, ...]
+    agent_grace_period: Tuple[int, ...]
+    next_unique_id: int
+
+
+def encode_value(value):
+    if isinstance(value, Object):
+        return ObjectRef(value.unique_id)
+    if type(value) is list:
+        return [encode_value(item) for item in value]
+    return value
+
+
+def decode_value(value, objects):
+    if type(value) is ObjectRef:
+        return objects[value.unique_id]
+    if type(value) is list:
+        return [decode_value(item, objects) for item in value]
+    return value
+
+
+def get_attributes(obj):
+    """:return: (name, value) of every attribute set on `obj`, its slots first"""
+    attributes = [(name, getattr(obj, name)) for name in get_slot_names(type(obj)) if hasattr(obj, name)]
+    attributes.extend(getattr(obj, "__dict__", {}).items())
+    return attributes
+
+
+def encode_object(obj):
+    return type(obj), {name: encode_value(value) for name, value in get_attributes(obj) if name != "world"}
+
+
+def save_object(obj):
+    """:return: attributes of `obj` to put back with decode_object(), the references to other objects are kept"""
+    return {name: copy_value(value, {}) for name, value in get_attributes(obj) if name != "world"}
+
+
+def decode_object(obj, attributes, objects):
+    for name in get_slot_names(type(obj)):
+        if name not in attributes and hasattr(obj, name):
+            delattr(obj, name)
+    if hasattr(obj, "__dict__"):
+        obj.__dict__.clear()
+    for name, value in attributes.items():
+        setattr(obj, name, decode_value(value, objects))
+    obj.world = None
+
+
+def copy_value(value, copies):
+    if isinstance(value, Object):
+        return copies.get(value, value)
+    if type(value) is list:
+        return [copy_value(item, copies) for item in value]
+    return value
+
+
+def copy_objects(objects):
+    """
+    Copy `objects` without their world. References between them point to the copies, references to any other object
+    are kept as they are.
+
+    :return: dict mapping every object to its copy
+    """
+    copies = {obj: type(obj).__new__(type(obj)) for obj in objects}
+    for obj, copied in copies.items():
+        for name, value in get_attributes(obj):
+            setattr(copied, name, copy_value(value, copies))
+        copied.world = None
+    return copies
@@ -6,6 +6,7 @@ from cooking_zoo.cooking_world.cooking_world import CookingWorld
 from cooking_zoo.cooking_world.world_objects import *
 from cooking_zoo.cooking_world.actions import *
 from cooking_zoo.cooking_book.recipe_drawer import RECIPES, NUM_GOALS, RECIPE_STORE, DEFAULT_NUM_GOALS
+from cooking_zoo.cooking_book.delivery_classifier import classify_delivery, split_deliveries
 
 import numpy as np
 from collections import namedtuple, defaultdict
@@ -19,7 +20,7 @@ import gymnasium as gym
 
 
 CollisionRepr = namedtuple("CollisionRepr", "time agent_names agent_locations")
-COLORS = ['blue', 'magenta', 'yellow', 'green']
+COLORS = AGENT_COLORS
 
 FPS = 20
 
@@ -27,7 +28,7 @@ FPS = 20
 def env(level, meta_file, num_agents, max_steps, recipes, agent_visualization=None, obs_spaces=None,
         end_condition_all_dishes=False, action_scheme="scheme1", render=False, reward_scheme=None,
         agent_respawn_rate=0.0, grace_period=20, agent_despawn_rate=0.0, ignore_completed_recipes=False,
-        agents_arms=None):
+        agents_arms=None, share_level_templates=False, layout_pool=None):
     """
     The env function wraps the environment in 3 wrappers by default. These
     wrappers contain logic that is common to many pettingzoo environments.
@@ -40,7 +41,8 @@ def env(level, meta_file, num_agents, max_steps, recipes, agent_visualization=No
                                   action_scheme=action_scheme, render=render, reward_scheme=reward_scheme,
                                   agent_respawn_rate=agent_respawn_rate, grace_period=grace_period,
                                   agent_despawn_rate=agent_despawn_rate,
-                                  ignore_completed_recipes=ignore_completed_recipes, agents_arms=agents_arms)
+                                  ignore_completed_recipes=ignore_completed_recipes, agents_arms=agents_arms,
+                                  share_level_templates=share_level_templates, layout_pool=layout_pool)
     env_init = wrappers.CaptureStdoutWrapper(env_init)
     env_init = wrappers.OrderEnforcingWrapper(env_init)
     return env_init
@@ -66,7 +68,8 @@ class CookingEnvironment(AECEnv):
     def __init__(self, level, meta_file, num_agents, max_steps, recipes, agent_visualization=None, obs_spaces=None,
                  end_condition_all_dishes=False, allowed_objects=None, action_scheme="scheme1", render=False,
                  reward_scheme=None, agent_respawn_rate=0.0, grace_period=20, agent_despawn_rate=0.0,
-                 ignore_completed_recipes=False, agents_arms=None):
+                 ignore_completed_recipes=False, agents_arms=None, share_level_templates=False,
+                 layout_pool=None):
         super().__init__()
 
         obs_spaces = obs_spaces or ["feature_vector"]
@@ -86,6 +89,8 @@ class CookingEnvironment(AECEnv):
         self.agent_respawn_rate = agent_respawn_rate
         self.agent_despawn_rate = agent_despawn_rate
         self.grace_period = grace_period
+        self.share_level_templates = share_level_templates
+        self.layout_pool = layout_pool
 
         self.level = level
         self.max_steps = max_steps
@@ -94,7 +99,8 @@ class CookingEnvironment(AECEnv):
         self.set_filename()
         self.meta_file = meta_file
         self.world = CookingWorld(self.action_scheme_class, meta_file, agent_respawn_rate=agent_respawn_rate,
-                                  grace_period=grace_period, agent_despawn_rate=agent_despawn_rate)
+                                  grace_period=grace_period, agent_despawn_rate=agent_despawn_rate,
+                                  share_level_templates=share_level_templates, layout_pool=layout_pool)
         assert self.num_agents <= self.world.meta_object_information["Agent"], \
             "Too many agents for this level"
         self.recipe_names = recipes
@@ -108,7 +114,9 @@ class CookingEnvironment(AECEnv):
         else:
             self.recipes = RECIPES
             self.num_goals = DEFAULT_NUM_GOALS
-        self.recipe_graphs = [self.recipes[recipe]() for recipe in recipes]
+        # agents given the same recipe share its Recipe, so it is evaluated once per step
+        self.shared_recipe_graphs = {recipe: self.recipes[recipe]() for recipe in dict.fromkeys(recipes)}
+        self.recipe_graphs = [self.shared_recipe_graphs[recipe] for recipe in recipes]
 
         self.termination_info = ""
 
@@ -205,10 +213,12 @@ class CookingEnvironment(AECEnv):
         if options["full_reset"]:
             self.world = CookingWorld(self.action_scheme_class, self.meta_file,
                                       agent_respawn_rate=self.agent_respawn_rate, grace_period=self.grace_period,
-                                      agent_despawn_rate=self.agent_despawn_rate)
+                                      agent_despawn_rate=self.agent_despawn_rate,
+                                      share_level_templates=self.share_level_templates,
+                                      layout_pool=self.layout_pool)
         self.world.load_level(level=self.level, num_agents=self.num_agents, agents_arms=self.agents_arms)
 
-        for recipe in self.recipe_graphs:
+        for recipe in self.shared_recipe_graphs.values():
             recipe.update_recipe_state(self.world)
 
         # Get an image observation
@@ -220,7 +230,7 @@ class CookingEnvironment(AECEnv):
         self._cumulative_rewards = dict(zip(self.agents, [0 for _ in self.agents]))
         self.terminations = dict(zip(self.agents, [False for _ in self.agents]))
         self.truncations = dict(zip(self.agents, [False for _ in self.agents]))
-        self.infos = dict(zip(self.agents, [{} for _ in self.agents]))
+        self.infos = {agent: {"action_mask": self.action_mask(agent)} for agent in self.agents}
         self.accumulated_actions = []
 
     def close(self):
@@ -263,22 +273,20 @@ class CookingEnvironment(AECEnv):
         info = {"t": self.t, "termination_info": self.termination_info}
 
         world_deleted = self.world.to_delete
-        if world_deleted:
+        # each delivery square's objects are classified on their own, the handlers get the completed Recipes
+        for delivery in split_deliveries(world_deleted):
+            completed = classify_delivery(delivery)
             recipe_completed = False
             for name in self.recipe_names:
-                recipe = RECIPES[name]()
-                recipe.update_recipe_state(world_deleted)
-                if recipe.completed():
-                    self.handle_absorbed_recipe(name, recipe)
+                if name in completed:
+                    self.handle_absorbed_recipe(name, completed[name])
                     recipe_completed = True
             if not recipe_completed:
                 for name in RECIPES.keys():
-                    recipe = RECIPES[name]()
-                    recipe.update_recipe_state(world_deleted)
-                    if recipe.completed():
-                        self.handle_dud_recipe(name, recipe)
+                    if name in completed:
+                        self.handle_dud_recipe(name, completed[name])
                 print("Absorbed something that didn't complete a recipe")
-            world_deleted.clear()
+        world_deleted.clear()
 
         self.rewards = {}
         self.terminations = {}
@@ -294,7 +302,8 @@ class CookingEnvironment(AECEnv):
             self.rewards[agent] = rewards[idx - offset_idx]
             self.terminations[agent] = dones[idx - offset_idx] if not self.ignore_completed_recipes else False
             self.truncations[agent] = truncations[idx - offset_idx]
-            self.infos[agent] = {"goal_vector": self.goal_vectors[agent], **info, **infos[idx - offset_idx]}
+            self.infos[agent] = {"goal_vector": self.goal_vectors[agent], **info, **infos[idx - offset_idx],
+                                 "action_mask": self.action_mask(agent)}
             self._cumulative_rewards[agent] += rewards[idx - offset_idx]
 
         self.agents = [agent for idx, agent in enumerate(self.possible_agents[:])
@@ -302,7 +311,7 @@ class CookingEnvironment(AECEnv):
         self._agent_selector = AgentSelector(self.agents)
 
     def observe(self, agent):
-        obs_space = self.obs_spaces[self.possible_agents.index(agent)]
+        obs_space = self.obs_spaces[self.agent_name_mapping[agent]]
         observation = []
         if "full" == obs_space:
             num_observation = {'feature_vector': self.current_tensor_observation,
@@ -327,16 +336,22 @@ class CookingEnvironment(AECEnv):
         # Done if the episode maxes out
         truncations = self.compute_truncated()
 
-        for idx, recipe in enumerate(self.recipe_graphs):
+        recipe_results = {}
+        for name, recipe in self.shared_recipe_graphs.items():
             goals_before = recipe.goals_completed(self.num_goals)
             completion_before = recipe.completed()
-            recipe.update_recipe_state(self.world)
-            open_goals[idx] = recipe.goals_completed(self.num_goals)
+            recipe.update_recipe_state(self.world, self.world.changes)
+            goals_after = recipe.goals_completed(self.num_goals)
             malus = not recipe.completed() and completion_before
             bonus = recipe.completed() and not completion_before
-            rewards[idx] += (sum(goals_before) - sum(open_goals[idx])) * self.reward_scheme["recipe_node_reward"]
-            rewards[idx] += bonus * self.reward_scheme["recipe_reward"]
-            rewards[idx] += malus * self.reward_scheme["recipe_penalty"]
+            reward = (sum(goals_before) - sum(goals_after)) * self.reward_scheme["recipe_node_reward"]
+            reward += bonus * self.reward_scheme["recipe_reward"]
+            reward += malus * self.reward_scheme["recipe_penalty"]
+            recipe_results[name] = (goals_after, reward)
+
+        for idx, name in enumerate(self.recipe_names):
+            open_goals[idx], reward = recipe_results[name]
+            rewards[idx] += reward
             rewards[idx] += (self.reward_scheme["max_time_penalty"] / self.max_steps)
 
         infos = self.compute_infos(active_agents_start, actions)
@@ -351,9 +366,10 @@ class CookingEnvironment(AECEnv):
         infos = []
         offset_idx = 0
         recipe_evaluations = [recipe.completed() for recipe in self.recipe_graphs]
+        relevant_agents = set(self.world.relevant_agents)
         for idx, agent in enumerate(self.possible_agents):
             world_agent = self.world_agent_mapping[agent]
-            if world_agent not in self.world.relevant_agents:
+            if world_agent not in relevant_agents:
                 offset_idx += 1
                 continue
             if not active_agents_start[idx]:
@@ -364,18 +380,19 @@ class CookingEnvironment(AECEnv):
         return infos
 
     def compute_truncated(self):
+        relevant_agents = set(self.world.relevant_agents)
         if self.t >= self.max_steps:
             self.termination_info = f"Terminating because {self.max_steps} timesteps passed"
             truncated = [True] * len(self.world.relevant_agents)
             self.world.active_agents = [False] * self.num_agents
-            self.world.status_changed = [True if agent in self.world.relevant_agents else False
+            self.world.status_changed = [True if agent in relevant_agents else False
                                          for agent in self.world.agents]
         else:
             truncated = [False] * len(self.world.relevant_agents)
 
         offset_idx = 0
         for idx, agent in enumerate(self.world.agents):
-            if agent not in self.world.relevant_agents:
+            if agent not in relevant_agents:
                 offset_idx += 1
                 continue
             if self.world.status_changed[idx] and not self.world.active_agents[idx]:
@@ -405,6 +422,12 @@ class CookingEnvironment(AECEnv):
         new_vector = np.array(feature_vector)
         return new_vector
 
+    def action_mask(self, agent):
+        """
+        :return: boolean mask over action_spaces[agent], True for the actions that would change something
+        """
+        return self.world.valid_action_mask(self.world_agent_mapping[agent], self.action_spaces[agent].n)
+
     def get_agent_names(self):
         return [agent.name for agent in self.world.agents]
 
@@ -9,7 +9,7 @@ import os.path
 import math
 
 
-COLORS = ['blue', 'magenta', 'yellow', 'green']
+COLORS = AGENT_COLORS
 
 _image_library = {}
 
@@ -24,6 +24,16 @@ def get_image(path):
     return image
 
 
+def get_tinted_image(path, color):
+    """Grayscale version of the image at `path` multiplied by `color`, for agents without an image of their colour"""
+    image = _image_library.get((path, color))
+    if image is None:
+        image = pygame.transform.grayscale(get_image(path))
+        image.fill(pygame.Color(color), special_flags=pygame.BLEND_RGB_MULT)
+        _image_library[(path, color)] = image
+    return image
+
+
 GraphicsProperties = namedtuple("GraphicsProperties", ["pixel_per_tile", "holding_scale", "container_scale",
                                                        "width_pixel", "height_pixel", "tile_size", "holding_size",
                                                        "container_size", "holding_container_size"])
@@ -114,8 +124,9 @@ class GraphicPipeline:
         dynamic_objects_grouped = defaultdict(list)
         for obj in dynamic_objects:
             dynamic_objects_grouped[obj.location].append(obj)
+        agent_locations = {agent.location for agent in self.world.agents}
         for location, obj_list in dynamic_objects_grouped.items():
-            if any([agent.location == location for agent in self.world.agents]):
+            if location in agent_locations:
                 self.draw_dynamic_object_stack(obj_list, self.graphics_properties.holding_size,
                                                self.holding_location(location),
                                                self.graphics_properties.holding_container_size,
@@ -140,8 +151,12 @@ class GraphicPipeline:
     def draw_agents(self):
         for idx, agent in enumerate(self.world.relevant_agents):
             agent_string = self.agent_visualization[idx]
-            self.draw(f'{agent_string}-{agent.color}', self.graphics_properties.tile_size,
-                      self.scaled_location(agent.location), agent.display_text(), agent.icons())
+            if agent.color in COLORS:
+                self.draw(f'{agent_string}-{agent.color}', self.graphics_properties.tile_size,
+                          self.scaled_location(agent.location), agent.display_text(), agent.icons())
+            else:
+                self.draw(f'{agent_string}-{COLORS[0]}', self.graphics_properties.tile_size,
+                          self.scaled_location(agent.location), agent.display_text(), agent.icons(), tint=agent.color)
             if agent.orientation == 1:
                 file_name = "arrow_left"
                 location = self.scaled_location(agent.location)
@@ -168,9 +183,10 @@ class GraphicPipeline:
                 raise ValueError(f"Agent orientation invalid ({agent.orientation})")
             self.draw(file_name, size, location, "", [])
 
-    def draw(self, path, size, location, text, icons):
+    def draw(self, path, size, location, text, icons, tint=None):
         image_path = f'{self.root_dir}/{self.graphics_dir}/{path}.png'
-        image = pygame.transform.scale(get_image(image_path), (int(size[0]), int(size[1])))
+        image = get_image(image_path) if tint is None else get_tinted_image(image_path, tint)
+        image = pygame.transform.scale(image, (int(size[0]), int(size[1])))
         self.screen.blit(image, location)
 
         if text:
@@ -1,10 +1,18 @@
+import json
+import os
+import pickle
 import pytest
+import random
 import time
 
+import numpy as np
+
 import cooking_zoo.cooking_book.recipe
 from cooking_zoo.cooking_world.abstract_classes import DynamicObject, StaticObject, ContentObject
 from cooking_zoo.cooking_world.constants import ChopFoodStates, ToasterFoodStates
 from cooking_zoo.cooking_world.cooking_world import CookingWorld
+from cooking_zoo.cooking_world.component_store import ComponentStore
+from cooking_zoo.cooking_world.actions import ActionScheme1, ActionScheme3
 from cooking_zoo.cooking_world.world_objects import Lettuce, Tomato, Plate, Deliversquare, Bread, Counter, Agent, \
     PlateDispenser, AppleDispenser, OnionDispenser, BananaDispenser, CarrotDispenser, TomatoDispenser, LettuceDispenser, \
     WatermelonDispenser, BreadDispenser, PastaDispenser
@@ -37,6 +45,20 @@ def example_environment(agents_arms=None):
     return env, recipes
 
 
+def write_test_level(tmp_path, name, layout, agents, meta, dynamic_objects=()):
+    """
+    Write a level of `layout` with the `agents` and `dynamic_objects` specs and no static objects, and its meta file
+    :return: paths of the level file and the meta file
+    """
+    level_file = tmp_path / f"{name}.json"
+    level_file.write_text(json.dumps({
+        "LEVEL_LAYOUT": layout, "STATIC_OBJECTS": [], "DYNAMIC_OBJECTS": list(dynamic_objects),
+        "DYNAMIC_EXCLUDED_POSITIONS": [], "AGENTS": agents}))
+    meta_file = tmp_path / f"{name}_meta.json"
+    meta_file.write_text(json.dumps(meta))
+    return str(level_file), str(meta_file)
+
+
 class TestCookingZoo_heuristic_agent:
     def test_cooking_zoo(self):
         """
@@ -148,6 +170,134 @@ class TestCookingZoo:
         objects = [lettuce, tomato, plate]
         assert check_recipe(TomatoLettucePlate) == True
         assert check_recipe(TomatoLettuceSalad) == False
+        assert objects == [lettuce, tomato, plate]
+
+    def test_recipe_checker_world(self):
+        world = CookingWorld(meta_file="example")
+        world.load_level("coop_test", 2, [1, 1])
+        for food in world.world_objects["Lettuce"] + world.world_objects["Tomato"]:
+            food.chop()
+        world_objects = {name: list(objects) for name, objects in world.world_objects.items()}
+        recipe = Recipe(ChoppedOnion, DEFAULT_NUM_GOALS)
+        recipe.update_recipe_state(world)
+        assert not recipe.completed()
+        recipe = Recipe(TomatoLettucePlate, DEFAULT_NUM_GOALS)
+        recipe.update_recipe_state(world)
+        assert not recipe.completed()
+        assert world.world_objects == world_objects
+        recipe = Recipe(ChoppedTomato, DEFAULT_NUM_GOALS)
+        recipe.update_recipe_state(world)
+        assert recipe.completed() and recipe.root_node.world_objects[0] in world.world_objects["Tomato"]
+
+    def test_incremental_recipe_state(self):
+        from cooking_zoo.cooking_book.recipe_drawer import RECIPES
+        random.seed(0)
+        world = CookingWorld(meta_file="example")
+        world.load_level("coop_test", 2, [1, 1])
+        recipes = {name: RECIPES[name]() for name in RECIPES}
+        for recipe in recipes.values():
+            recipe.update_recipe_state(world)
+        for _ in range(300):
+            world.world_step([random.randrange(len(ActionScheme1.ACTIONS)) for _ in world.agents])
+            for name, recipe in recipes.items():
+                recipe.update_recipe_state(world, world.changes)
+                full = RECIPES[name]()
+                full.update_recipe_state(world)
+                assert [(node.marked, node.world_objects) for node in recipe.node_list] == \
+                       [(node.marked, node.world_objects) for node in full.node_list]
+
+    def test_recipe_programs(self):
+        from cooking_zoo.cooking_book.recipe_drawer import RECIPES
+        from cooking_zoo.cooking_book.recipe_program import compile_recipes, evaluate_recipes
+        from cooking_zoo.cooking_world.batched_world import BatchedCookingWorld
+        random.seed(0)
+        programs = compile_recipes(RECIPES)
+        batch = BatchedCookingWorld.from_level(3, "coop_test", 2, meta_file="example")
+        for _ in range(300):
+            batch.step([[random.randrange(len(ActionScheme1.ACTIONS)) for _ in range(2)] for _ in batch.worlds])
+            results = evaluate_recipes(list(programs.values()), batch.worlds)
+            for (name, program), (marked, matched) in zip(programs.items(), results):
+                goals = program.goals_completed(marked, DEFAULT_NUM_GOALS)
+                for idx, world in enumerate(batch.worlds):
+                    recipe = RECIPES[name]()
+                    recipe.update_recipe_state(world)
+                    objects = world.get_object_list() + world.agents
+                    assert marked[idx].tolist() == [node.marked for node in recipe.node_list]
+                    assert [objects[row] for row in matched[idx] if row >= 0] == \
+                           [obj for node in recipe.node_list for obj in node.world_objects]
+                    assert (goals[idx] == recipe.goals_completed(DEFAULT_NUM_GOALS)).all()
+
+    def test_recipe_programs_list_order(self):
+        from cooking_zoo.cooking_book.recipe_drawer import RECIPES
+        from cooking_zoo.cooking_book.recipe_program import RecipeProgram
+        world = CookingWorld(meta_file="example")
+        world.load_level("coop_test", 2, [1, 1])
+        plate, other_plate = world.world_objects["Plate"]
+        tomato = world.world_objects["Tomato"][0]
+        tomato.chop()
+        tomato.move_to(plate.location)
+        other_plate.move_to(plate.location)
+        # both plates fit, the recipe claims the first one in world_objects, not the one with the lowest id
+        state = world.get_state()
+        world.set_state(state._replace(world_objects=tuple(
+            (name, ids[::-1] if name == "Plate" else ids) for name, ids in state.world_objects)))
+        fork = world.fork()
+        for checked in (world, fork):
+            recipe = RECIPES["TomatoSaladPlate"]()
+            recipe.update_recipe_state(checked)
+            marked, matched = RecipeProgram(recipe).evaluate(checked)
+            objects = checked.get_object_list() + checked.agents
+            assert recipe.root_node.world_objects[0].unique_id == other_plate.unique_id
+            assert [objects[row] for row in matched[0] if row >= 0] == \
+                   [obj for node in recipe.node_list for obj in node.world_objects]
+
+    def test_delivery_classifier(self):
+        from cooking_zoo.cooking_book.delivery_classifier import classify_delivery, delivery_key, split_deliveries, \
+            DELIVERY_INDEX
+        from cooking_zoo.cooking_book.recipe_drawer import RECIPES
+
+        def delivery(location, chopped):
+            lettuce, tomato, plate = Lettuce(location), Tomato(location), Plate(location)
+            if chopped:
+                lettuce.chop()
+                tomato.chop()
+            return [plate, lettuce, tomato]
+
+        for objects in (delivery((1, 1), True), delivery((2, 3), True), delivery((1, 1), False),
+                        delivery((1, 1), True) + delivery((2, 2), False)):
+            expected = set()
+            for name in RECIPES:
+                recipe = RECIPES[name]()
+                recipe.update_recipe_state(objects)
+                if recipe.completed():
+                    expected.add(name)
+            completed = classify_delivery(objects)
+            assert set(completed) == expected
+            assert all(recipe.completed() for recipe in completed.values())
+        assert "TomatoLettucePlate" in classify_delivery(delivery((5, 5), True))
+        assert not classify_delivery(delivery((5, 5), False))
+        # the index is built up front and the key ignores the order and the location of the objects
+        assert delivery_key(delivery((5, 5), True)) in DELIVERY_INDEX
+        assert delivery_key(delivery((5, 5), True)[::-1]) == delivery_key(delivery((7, 1), True))
+        size = len(DELIVERY_INDEX)
+        classify_delivery(delivery((1, 1), False) + delivery((2, 2), True))
+        assert len(DELIVERY_INDEX) == size
+        # what two delivery squares consumed in the same step is looked up square by square
+        deliveries = split_deliveries(delivery((1, 1), True) + delivery((2, 2), True))
+        assert len(deliveries) == 2 and all(delivery_key(objects) in DELIVERY_INDEX for objects in deliveries)
+
+    def test_shared_recipe_evaluation(self):
+        env = parallel_env(level="switch_test", meta_file="example", num_agents=2, max_steps=20,
+                           recipes=["TomatoLettuceSalad", "TomatoLettuceSalad"],
+                           obs_spaces=["feature_vector", "feature_vector"], action_scheme="scheme1")
+        env.reset(seed=0)
+        unwrapped = env.unwrapped
+        assert unwrapped.recipe_graphs[0] is unwrapped.recipe_graphs[1]
+        assert list(unwrapped.shared_recipe_graphs) == ["TomatoLettuceSalad"]
+        random.seed(0)
+        while env.agents:
+            _, rewards, _, _, _ = env.step({agent: random.randrange(6) for agent in env.agents})
+            assert len(set(rewards.values())) <= 1
 
     def test_bread_types(self):
         bread = Bread((0, 0))
@@ -363,3 +513,513 @@ class TestCookingZoo:
             assert removed == []
             assert suc
             assert len(dispenser.content) == 1
+
+    def test_switch_toggles_block(self):
+        world = CookingWorld(ActionScheme1, meta_file="example")
+        world.load_level("switch_test", 1, [1])
+        switch = world.world_objects["Switch"][0]
+        block = world.world_objects["Block"][0]
+        assert block in switch.linked_objects and switch in block.linked_objects
+        assert not world.pending_linked_objects and not world.walkable_grid[block.location]
+        agent = world.agents[0]
+        agent.location = (switch.location[0] + 1, switch.location[1])
+        world.world_step([ActionScheme1.WALK_LEFT])
+        assert agent.location == switch.location and switch.switch_active
+        assert block.walkable and world.walkable_grid[block.location]
+        assert not world.pending_linked_objects
+        world.world_step([ActionScheme1.NO_OP])
+        assert block.walkable
+
+    def test_abstract_game_classes(self):
+        from cooking_zoo.cooking_world.abstract_classes import ABSTRACT_GAME_CLASSES, StateAttribute
+        assert StateAttribute not in ABSTRACT_GAME_CLASSES
+        assert ContentObject in ABSTRACT_GAME_CLASSES and StaticObject in ABSTRACT_GAME_CLASSES
+
+    def test_slotted_objects(self):
+        world = CookingWorld(meta_file="example")
+        world.load_level("coop_test", 2, [1, 1])
+        for obj in world.get_object_list() + world.agents:
+            assert not hasattr(obj, "__dict__"), type(obj).__name__
+        copied = pickle.loads(pickle.dumps(world))
+        for obj, copied_obj in zip(world.get_object_list(), copied.get_object_list()):
+            assert obj.unique_id == copied_obj.unique_id and obj.location == copied_obj.location
+            assert obj.walkable == copied_obj.walkable and copied_obj.world is copied
+
+
+class TestCookingZoo_world_indexes:
+    def test_location_index(self):
+        world = CookingWorld(meta_file="example")
+        agent = Agent((1, 0), '', 'foo', 1)
+        counter = Counter((0, 0))
+        plate = Plate((0, 0))
+        lettuce = Lettuce((0, 0))
+        lettuce.chop()
+        plate.add_content(lettuce)
+        for obj in [counter, plate, lettuce]:
+            world.add_object(obj)
+        assert world.get_objects_at((0, 0)) == [counter, plate, lettuce]
+        assert world.get_objects_at((0, 0), DynamicObject) == [plate, lettuce]
+
+        agent.grab(plate)  # moves the plate and its content
+        assert world.get_objects_at((0, 0)) == [counter]
+        assert world.get_objects_at((1, 0), ContentObject) == [plate]
+
+        agent.move_to((2, 0))
+        assert world.get_objects_at((1, 0)) == []
+        assert world.get_objects_at((2, 0)) == [plate, lettuce]
+
+        world.delete_object(lettuce)
+        assert world.get_objects_at((2, 0)) == [plate]
+        assert lettuce.world is None
+
+    def test_walkability_and_occupancy_grids(self):
+        from cooking_zoo.cooking_world.world_objects import Block
+        world = CookingWorld(meta_file="example")
+        world.load_level("switch_test", 2, [1, 1])
+        for obj in world.get_object_list():
+            if isinstance(obj, StaticObject):
+                assert world.square_walkable(obj.location) == obj.walkable
+        block = world.world_objects["Block"][0]
+        block.switch_state()
+        assert world.square_walkable(block.location) == block.walkable
+
+        first, second = world.agents
+        assert world.agent_at(first.location) and world.agent_at(second.location)
+        assert world.agent_occupancy.sum() == 2
+        old_location = first.location
+        first.move_to((3, 1))
+        assert not world.agent_at(old_location) or old_location == (3, 1)
+        assert world.agent_at((3, 1))
+
+        # two agents walking onto the same square both stay put
+        first.move_to((3, 1))
+        second.move_to((3, 3))
+        assert world.check_collisions([first, second], [3, 4]) == [0, 0]
+        assert world.check_collisions([first, second], [1, 2]) == [1, 2]
+
+    def test_abstract_index(self):
+        from cooking_zoo.cooking_world.abstract_classes import ActionObject
+        from cooking_zoo.cooking_world.world_objects import ClassToAbstractClasses
+        assert {ActionObject, ContentObject, StaticObject} <= set(ClassToAbstractClasses[PlateDispenser])
+
+        world = CookingWorld(meta_file="example")
+        plates = [Plate((0, 0)), Plate((1, 0)), Plate((2, 0))]
+        world.handle_object_creation(plates)
+        assert list(world.abstract_index[ContentObject]) == plates
+        world.handle_object_deletion([plates[1]])
+        assert list(world.abstract_index[ContentObject]) == [plates[0], plates[2]]
+        assert list(world.abstract_index[DynamicObject]) == [plates[0], plates[2]]
+
+    def test_active_objects(self):
+        from cooking_zoo.cooking_world.world_objects import Toaster
+        world = CookingWorld(meta_file="example")
+        toaster = Toaster((0, 0))
+        bread = Bread((0, 0))
+        bread.chop()
+        world.handle_object_creation([toaster, bread])
+        assert toaster not in world.active_objects
+        toaster.add_content(bread)
+        toaster.action()
+        assert toaster in world.active_objects
+        for _ in range(bread.min_progress):
+            world.progress_world()
+        assert bread.toast_state == ToasterFoodStates.TOASTED
+        assert not toaster.toggle and toaster not in world.active_objects
+
+    def test_change_log(self):
+        world = CookingWorld(meta_file="example")
+        lettuce = Lettuce((1, 1))
+        plate = Plate((1, 1))
+        world.handle_object_creation([lettuce, plate])
+        lettuce.chop()
+        lettuce.move_to((2, 1))
+        plate.move_to((2, 1))
+        plate.move_to((1, 1))
+        world.handle_object_deletion([plate])
+        changes = world.changes
+        assert changes.created == [lettuce, plate]
+        assert changes.deleted == [plate]
+        assert changes.moved == {lettuce: ((1, 1), (2, 1))}
+        assert changes.state_changed == {lettuce: {"chop_state": (ChopFoodStates.FRESH, ChopFoodStates.CHOPPED)}}
+
+    def test_component_store(self):
+        world = CookingWorld(meta_file="example")
+        world.load_level("switch_test", 2, [1, 1])
+        for _ in range(50):
+            world.world_step([random.randrange(len(ActionScheme1.ACTIONS)) for _ in world.agents])
+        store = ComponentStore(world)
+        objects = world.get_object_list() + world.agents
+        assert len(store) == len(objects) and store.objects == objects
+        rows = store.rows_of(objects)
+        assert (store.location[rows] == [obj.location for obj in objects]).all()
+        assert (store.walkable[rows] == [obj.walkable for obj in objects]).all()
+        for name in ComponentStore.STATE_COLUMNS:
+            assert (store[name][rows] == [ComponentStore.encode(getattr(obj, name, None)) for obj in objects]).all()
+        for container in world.abstract_index[ContentObject]:
+            for content in container.content:
+                if content.movable:
+                    assert store.parent[store.row(content)] == store.row(container)
+
+
+class TestCookingZoo_movement:
+    def test_collisions_single_pass(self, tmp_path):
+        level_file, meta_file = write_test_level(
+            tmp_path, "corridor", "-----\n-   -\n-   -\n-----",
+            [{"MAX_COUNT": 1, "X_POSITION": [x], "Y_POSITION": [y]} for x, y in ((1, 1), (3, 1), (1, 2))],
+            [{"Counter": 20}, {"Agent": 3}])
+        world = CookingWorld(ActionScheme1, meta_file)
+        world.load_level(level_file, 3, [1] * 3)
+        # the first two collide on (2, 1), the third walks onto the square the first one tried to leave, which the
+        # collision check doesn't look at again
+        assert world.check_collisions(world.agents, [2, 1, 4]) == [0, 0, 4]
+
+    def test_many_agents(self, tmp_path):
+        num_agents = 40
+        layout = "\n".join(["-" * 12] + ["-" + " " * 10 + "-"] * 10 + ["-" * 12])
+        level_file, meta_file = write_test_level(
+            tmp_path, "crowded", layout,
+            [{"MAX_COUNT": num_agents, "X_POSITION": list(range(1, 11)), "Y_POSITION": list(range(1, 11))}],
+            [{"Counter": 44}, {"Agent": num_agents}])
+        world = CookingWorld(ActionScheme1, meta_file)
+        world.load_level(level_file, num_agents, [1] * num_agents)
+        assert len(world.agents) == num_agents
+        assert len({agent.color for agent in world.agents}) == num_agents
+        for _ in range(20):
+            world.world_step([random.randrange(len(ActionScheme1.ACTIONS)) for _ in world.agents])
+            locations = [agent.location for agent in world.agents]
+            assert world.agent_occupancy.sum() == num_agents
+            assert all(world.agent_occupancy[location] == locations.count(location) for location in locations)
+
+    def test_action_mask(self):
+        env, _ = example_environment()
+        env.reset()
+        unwrapped = env.unwrapped
+        agent = unwrapped.possible_agents[0]
+        world_agent = unwrapped.world_agent_mapping[agent]
+        mask = unwrapped.action_mask(agent)
+        assert mask.shape == (unwrapped.action_spaces[agent].n,) and mask[0]
+        for action in range(1, len(mask)):
+            target_location = unwrapped.world.get_target_location(world_agent, action)
+            if unwrapped.world.square_walkable(target_location):
+                assert mask[action]
+        _, _, _, _, infos = env.step({agent: 0})
+        assert (infos[agent]["action_mask"] == unwrapped.action_mask(agent)).all()
+
+    @pytest.mark.parametrize("action_scheme", [ActionScheme1, ActionScheme3])
+    def test_batched_world(self, action_scheme):
+        from cooking_zoo.cooking_world.batched_world import BatchedCookingWorld
+
+        def make_worlds():
+            np.random.seed(0)
+            random.seed(0)
+            worlds = []
+            for _ in range(3):
+                world = CookingWorld(action_scheme, meta_file="example")
+                world.load_level("switch_test", 2, [1, 1])
+                worlds.append(world)
+            return worlds
+
+        def state(worlds):
+            return [[(agent.location, agent.orientation) for agent in world.agents] +
+                    [(obj.unique_id, obj.location) for obj in world.get_object_list()] for world in worlds]
+
+        # both reload the level half way through, the batch with reset()
+        reset_step = 50
+        actions = np.random.RandomState(0).randint(0, len(action_scheme.ACTIONS), size=(100, 3, 2))
+        worlds = make_worlds()
+        expected = []
+        for step, step_actions in enumerate(actions):
+            if step == reset_step:
+                random.seed(1)
+                for world in worlds:
+                    world.load_level("switch_test", 2, [1, 1])
+            for world, world_actions in zip(worlds, step_actions):
+                world.world_step(list(world_actions))
+            expected.append(state(worlds))
+        batched = BatchedCookingWorld(make_worlds())
+        for step, (step_actions, step_expected) in enumerate(zip(actions, expected)):
+            if step == reset_step:
+                random.seed(1)
+                batched.reset("switch_test", 2)
+            batched.step(step_actions)
+            assert state(batched.worlds) == step_expected
+            assert (batched.agent_locations == [[agent.location for agent in world.agents]
+                                                for world in batched.worlds]).all()
+
+    def test_batched_world_reload(self):
+        from cooking_zoo.cooking_world.batched_world import BatchedCookingWorld
+        random.seed(0)
+        batched = BatchedCookingWorld.from_level(2, "switch_test", 2, meta_file="example")
+
+        def check():
+            for idx, world in enumerate(batched.worlds):
+                assert np.shares_memory(world.walkable_grid, batched.walkable)
+                assert np.shares_memory(world.agent_occupancy, batched.agent_occupancy)
+                occupancy = np.zeros_like(world.agent_occupancy)
+                for agent in world.agents:
+                    occupancy[agent.location] += 1
+                assert (world.agent_occupancy == occupancy).all()
+                assert (batched.agent_locations[idx] == [agent.location for agent in world.agents]).all()
+
+        for _ in range(20):
+            batched.step([[random.randrange(len(ActionScheme1.ACTIONS)) for _ in range(2)] for _ in batched.worlds])
+        check()
+        # reloaded and changed outside of step()
+        batched.worlds[0].load_level("switch_test", 2, [1, 1])
+        agent = batched.worlds[1].agents[0]
+        agent.location = next(location for location in zip(*np.nonzero(batched.worlds[1].walkable_grid))
+                              if not batched.worlds[1].agent_at(location))
+        batched.step(np.zeros((2, 2), dtype=int))
+        check()
+        batched.reset("switch_test", 2)
+        check()
+        for _ in range(20):
+            batched.step([[random.randrange(len(ActionScheme1.ACTIONS)) for _ in range(2)] for _ in batched.worlds])
+            check()
+
+
+class TestCookingZoo_world_state:
+    def test_get_and_set_state(self):
+        np.random.seed(0)
+        random.seed(0)
+        world = CookingWorld(meta_file="example")
+        world.load_level("coop_test", 1, [1])
+
+        def summary():
+            return [(type(obj).__name__, obj.location, obj.get_physical_state().get("chop_state"),
+                     [content.unique_id for content in getattr(obj, "content", [])])
+                    for obj in world.get_object_list()] + \
+                   [(agent.location, agent.orientation, agent.holding) for agent in world.agents]
+
+        state = pickle.loads(pickle.dumps(world.get_state()))
+        expected = summary()
+        plates = list(world.world_objects["Plate"])
+        for action in np.random.RandomState(0).randint(0, 8, size=200):
+            world.world_step([action])
+        world.set_state(state)
+        assert summary() == expected
+        assert world.world_objects["Plate"] == plates
+        assert all(obj.world is world for obj in world.get_object_list())
+
+    def test_fork(self):
+        np.random.seed(0)
+        random.seed(0)
+        world = CookingWorld(meta_file="example")
+        world.load_level("coop_test", 1, [1])
+        objects = world.get_object_list()
+        locations = [obj.location for obj in objects]
+        child = world.fork()
+        assert child.get_object_list() == objects
+        for action in [1, 1, 4, 4, 2, 3, 5, 7, 6, 2, 5]:
+            child.world_step([action])
+        assert [obj.location for obj in world.get_object_list()] == locations
+        assert world.get_object_list() == objects
+        assert child.agents[0] is not world.agents[0]
+        # untouched objects are still shared
+        assert len(set(map(id, child.get_object_list())) & set(map(id, objects))) > len(objects) // 2
+
+    def test_reset_level(self):
+        np.random.seed(0)
+        random.seed(0)
+        world = CookingWorld(meta_file="example")
+        world.load_level("coop_test", 1, [1])
+        state = world.get_state()
+        objects = world.get_object_list()
+        agent = world.agents[0]
+        for action in np.random.RandomState(0).randint(0, 8, size=200):
+            world.world_step([action])
+        world.load_level("coop_test", 1, [1])
+        assert world.get_state() == state
+        assert world.get_object_list() == objects and world.agents[0] is agent
+        # forking shares the objects, the reset can't put them back in place anymore
+        for action in np.random.RandomState(1).randint(0, 8, size=100):
+            world.world_step([action])
+        child = world.fork()
+        child_state = child.get_state()
+        for action in np.random.RandomState(2).randint(0, 8, size=100):
+            world.world_step([action])
+        world.load_level("coop_test", 1, [1])
+        assert world.get_state() == state and child.get_state() == child_state
+
+    def test_reset_level_outside_step(self):
+        world = CookingWorld(meta_file="example")
+        world.load_level("coop_test", 1, [1])
+        state = world.get_state()
+        food = next(obj for obj in world.get_object_list() if hasattr(obj, "chop_state"))
+        # changed directly, not by a step, and away from the agent
+        food.chop()
+        food.move_to((0, 0))
+        world.world_step([0])
+        world.load_level("coop_test", 1, [1])
+        assert world.get_state() == state
+
+    def test_object_ids_per_world(self):
+        worlds = []
+        for _ in range(2):
+            world = CookingWorld(meta_file="example")
+            world.load_level("coop_test", 1, [1])
+            worlds.append(world)
+        bread = worlds[0].world_objects["Bread"][0]
+        next_id = worlds[0].next_unique_id
+        created, _, _ = bread.chop()
+        assert created[0].unique_id == next_id
+        assert worlds[1].next_unique_id == next_id
+        worlds[0].load_level("coop_test", 1, [1])
+        ids = [obj.unique_id for obj in worlds[0].get_object_list() + worlds[0].agents]
+        assert len(ids) == len(set(ids)) and worlds[0].next_unique_id > max(ids)
+
+
+class TestCookingZoo_level_loading:
+    def test_json_cache(self, tmp_path):
+        from cooking_zoo.cooking_world.engine.load_level import load_json, resolve_file
+        by_name = load_json(resolve_file("example", "meta_files"))
+        by_path = load_json(resolve_file(resolve_file("example", "meta_files"), "meta_files"))
+        assert by_name is by_path
+        file = tmp_path / "meta.json"
+        file.write_text(json.dumps([{"Agent": 1}]))
+        assert load_json(resolve_file(str(file), "meta_files")) == [{"Agent": 1}]
+        file.write_text(json.dumps([{"Agent": 2}]))
+        stat = file.stat()
+        os.utime(file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert load_json(resolve_file(str(file), "meta_files")) == [{"Agent": 2}]
+
+    def test_level_templates(self):
+        worlds = []
+        for _ in range(2):
+            world = CookingWorld(meta_file="example", share_level_templates=True)
+            world.load_level("coop_test", 2, [1, 1])
+            worlds.append(world)
+        first, second = worlds
+        objects = second.get_object_list()
+        locations = [obj.location for obj in objects]
+        assert [obj.location for obj in first.get_object_list()] == locations
+        assert first.agents[0] is not second.agents[0] and all(agent.world is first for agent in first.agents)
+        for action in [1, 1, 4, 4, 2, 3, 5, 7, 6, 2, 5]:
+            first.world_step([action, action])
+        assert second.get_object_list() == objects
+        assert [obj.location for obj in second.get_object_list()] == locations
+        # the objects nobody touched are still the template's
+        untouched = set(map(id, first.get_object_list())) & set(map(id, objects))
+        assert untouched and untouched == set(map(id, first.shared_objects))
+        # instantiating leaves the template as it is
+        template = CookingWorld.level_template("coop_test", "example", 2, [1, 1])
+        assert not template.shared_objects and template.undo_log is None
+        assert all(obj.world is None for obj in template.get_object_list())
+
+    def test_level_templates_layout_pool(self, tmp_path):
+        from cooking_zoo.cooking_world.engine.layout_pool import generate_layout_pool
+        pool_file = str(tmp_path / "pool.npz")
+        generate_layout_pool("coop_test", "example", 2, 3, pool_file, seed=0)
+        layouts = np.load(pool_file)["layouts"]
+        drawn = set()
+        for _ in range(30):
+            world = CookingWorld(meta_file="example", share_level_templates=True, layout_pool=pool_file)
+            world.load_level("coop_test", 2, [1, 1])
+            placements = np.array(world.placements)
+            drawn.add(next(idx for idx, layout in enumerate(layouts) if (placements == layout).all()))
+            assert [agent.location for agent in world.agents] == [tuple(location) for location in placements[-2:]]
+        assert len(drawn) > 1
+
+    def test_layout_pool(self, tmp_path):
+        from cooking_zoo.cooking_world.engine.layout_pool import generate_layout_pool
+        pool_file = tmp_path / "pool.npz"
+        generate_layout_pool("coop_test", "example", 2, 5, pool_file, seed=0)
+        layouts = np.load(pool_file)["layouts"]
+        assert layouts.shape[0] == 5
+        for _ in range(5):
+            world = CookingWorld(meta_file="example", layout_pool=str(pool_file))
+            world.load_level("coop_test", 2, [1, 1])
+            placements = np.array(world.placements)
+            assert any((placements == layout).all() for layout in layouts)
+            assert [agent.location for agent in world.agents] == [tuple(location) for location in placements[-2:]]
+        with pytest.raises(ValueError):
+            world = CookingWorld(meta_file="example", layout_pool=str(pool_file))
+            world.load_level("coop_test", 1, [1])
+
+    def test_placement_fills_every_tile(self, tmp_path):
+        layout = "\n".join(["-" * 6] + ["-" + " " * 4 + "-"] * 4 + ["-" * 6])
+        level_file, meta_file = write_test_level(
+            tmp_path, "full", layout,
+            [{"MAX_COUNT": 17, "X_POSITION": list(range(1, 5)), "Y_POSITION": list(range(1, 5))}],
+            [{"Counter": 20}, {"Plate": 21}, {"Agent": 17}],
+            dynamic_objects=[{"Plate": {"COUNT": 20, "X_POSITION": list(range(6)), "Y_POSITION": list(range(6))}}])
+        layouts = []
+        for _ in range(2):
+            random.seed(3)
+            world = CookingWorld(ActionScheme1, meta_file)
+            world.load_level(level_file, 16, [1] * 16)
+            layouts.append([obj.location for obj in world.world_objects["Plate"] + world.agents])
+        assert layouts[0] == layouts[1]
+        assert len(set(layouts[0][:20])) == 20 and len(set(layouts[0][20:])) == 16
+        with pytest.raises(ValueError):
+            world = CookingWorld(ActionScheme1, meta_file)
+            world.load_level(level_file, 17, [1] * 17)
+
+    def test_placement_keeps_position_weights(self, tmp_path):
+        level_file, meta_file = write_test_level(
+            tmp_path, "weighted", "----\n-  -\n----",
+            [{"MAX_COUNT": 1, "X_POSITION": [1, 1, 1, 2], "Y_POSITION": [1]}], [{"Counter": 10}, {"Agent": 1}])
+        random.seed(0)
+        left = 0
+        for _ in range(400):
+            world = CookingWorld(ActionScheme1, meta_file)
+            world.load_level(level_file, 1, [1])
+            left += world.agents[0].location == (1, 1)
+        # (1, 1) is listed three times, so it is drawn three times as often as (2, 1)
+        assert 260 < left < 340
+
+    def test_placement_checks_every_position(self, tmp_path):
+        agents = [{"MAX_COUNT": 1, "X_POSITION": [1], "Y_POSITION": [1]}]
+        for x_positions in ([1, 2, 4], [1, 2, 3]):
+            # (1, 1) is always free, the layout is 4 wide so x = 4 is out of bounds even though it is never drawn
+            level_file, meta_file = write_test_level(
+                tmp_path, "bounds", "----\n-  -\n----", agents, [{"Counter": 10}, {"Plate": 1}, {"Agent": 1}],
+                dynamic_objects=[{"Plate": {"COUNT": 1, "X_POSITION": x_positions, "Y_POSITION": [0]}}])
+            world = CookingWorld(ActionScheme1, meta_file)
+            if 4 in x_positions:
+                with pytest.raises(ValueError):
+                    world.load_level(level_file, 1, [1])
+            else:
+                world.load_level(level_file, 1, [1])
+                assert len(world.world_objects["Plate"]) == 1
+
+    def test_optional_placement_rate(self, tmp_path):
+        # only one of the three listed tiles is a counter, the optional plate is still placed half of the time
+        level_file, meta_file = write_test_level(
+            tmp_path, "optional", "----\n-  -\n----", [{"MAX_COUNT": 1, "X_POSITION": [1], "Y_POSITION": [1]}],
+            [{"Counter": 10}, {"Plate": 1}, {"Agent": 1}],
+            dynamic_objects=[{"Plate": {"COUNT": 1, "OPTIONAL": 0.5, "X_POSITION": [0, 1, 2], "Y_POSITION": [1]}}])
+        random.seed(0)
+        placed = 0
+        for _ in range(400):
+            world = CookingWorld(ActionScheme1, meta_file)
+            world.load_level(level_file, 1, [1])
+            placed += len(world.world_objects["Plate"])
+        assert 160 < placed < 240
+
+    def test_level_generator(self, tmp_path):
+        from cooking_zoo.cooking_world.engine.level_generator import write_level
+        level_file, meta_file = str(tmp_path / "kitchen.json"), str(tmp_path / "kitchen_meta.json")
+        write_level(level_file, meta_file, 100, 80, 9, appliances={"Cutboard": 20, "Deliversquare": 5},
+                    dispensers={"PlateDispenser": 10, "TomatoDispenser": 10}, dynamic_objects={"Plate": 4},
+                    rooms=(4, 3), corridor_width=2, seed=0)
+        world = CookingWorld(meta_file=meta_file)
+        world.load_level(level_file, 9, [1] * 9)
+        assert (world.width, world.height) == (100, 80) and len(world.agents) == 9
+        assert len(world.world_objects["Cutboard"]) == 20 and len(world.world_objects["Plate"]) == 4
+        floor = {obj.location for obj in world.world_objects["Floor"]}
+        reached, pending = {world.agents[0].location}, [world.agents[0].location]
+        while pending:
+            x, y = pending.pop()
+            for neighbour in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                if neighbour in floor and neighbour not in reached:
+                    reached.add(neighbour)
+                    pending.append(neighbour)
+        assert reached == floor
+        for obj in world.get_object_list():
+            if not isinstance(obj, (Counter, DynamicObject)) and not obj.walkable:
+                x, y = obj.location
+                assert {(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)} & reached, type(obj).__name__
+        world.world_step([random.randrange(len(ActionScheme1.ACTIONS)) for _ in world.agents])
+        with pytest.raises(ValueError):
+            write_level(level_file, meta_file, 10, 10, 2, appliances={"Cutboard": 40}, dispensers={})